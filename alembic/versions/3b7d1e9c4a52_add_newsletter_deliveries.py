@@ -0,0 +1,32 @@
+"""add_newsletter_deliveries
+Revision ID: 3b7d1e9c4a52
+Revises: ec86a99ea14f
+Create Date: 2026-10-18 12:04:31.218406
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+revision: str = '3b7d1e9c4a52'
+down_revision: Union[str, Sequence[str], None] = 'ec86a99ea14f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('newsletter_deliveries',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('newsletter_id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.BigInteger(), nullable=False),
+    sa.Column('status', postgresql.ENUM('PENDING', 'SENT', 'FAILED', name='deliverystatusenum'), server_default='PENDING', nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['newsletter_id'], ['newsletters.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('newsletter_id', 'chat_id', name='uq_newsletter_deliveries_chat')
+    )
+    op.create_index('ix_newsletter_deliveries_pending', 'newsletter_deliveries', ['newsletter_id', 'id'], unique=False, postgresql_where=sa.text("status = 'PENDING'"))
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_newsletter_deliveries_pending', table_name='newsletter_deliveries', postgresql_where=sa.text("status = 'PENDING'"))
+    op.drop_table('newsletter_deliveries')
+    postgresql.ENUM(name='deliverystatusenum').drop(op.get_bind(), checkfirst=True)
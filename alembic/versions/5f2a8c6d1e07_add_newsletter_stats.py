@@ -0,0 +1,32 @@
+"""add_newsletter_stats
+Revision ID: 5f2a8c6d1e07
+Revises: 3b7d1e9c4a52
+Create Date: 2026-10-18 13:21:09.540113
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+revision: str = '5f2a8c6d1e07'
+down_revision: Union[str, Sequence[str], None] = '3b7d1e9c4a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('newsletter_stats',
+    sa.Column('newsletter_id', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('success', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('blocked', sa.Integer(), nullable=False),
+    sa.Column('chat_not_found', sa.Integer(), nullable=False),
+    sa.Column('bad_request', sa.Integer(), nullable=False),
+    sa.Column('retry_exhausted', sa.Integer(), nullable=False),
+    sa.Column('unexpected', sa.Integer(), nullable=False),
+    sa.Column('error_samples', sa.JSON(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['newsletter_id'], ['newsletters.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('newsletter_id')
+    )
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('newsletter_stats')
@@ -0,0 +1,22 @@
+"""add_user_reachability
+Revision ID: 7c4e2b9f0d13
+Revises: 5f2a8c6d1e07
+Create Date: 2026-10-18 14:02:47.116093
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+revision: str = '7c4e2b9f0d13'
+down_revision: Union[str, Sequence[str], None] = '5f2a8c6d1e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('is_reachable', sa.Boolean(), server_default=sa.true(), nullable=False))
+    op.add_column('users', sa.Column('blocked_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_users_reachable_id', 'users', ['id'], unique=False, postgresql_where=sa.text('is_reachable'))
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_reachable_id', table_name='users', postgresql_where=sa.text('is_reachable'))
+    op.drop_column('users', 'blocked_at')
+    op.drop_column('users', 'is_reachable')
@@ -0,0 +1,18 @@
+"""add_delivery_claimed_at
+Revision ID: 9a1d5e3b7f24
+Revises: 7c4e2b9f0d13
+Create Date: 2026-10-18 15:10:32.804517
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+revision: str = '9a1d5e3b7f24'
+down_revision: Union[str, Sequence[str], None] = '7c4e2b9f0d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('newsletter_deliveries', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('newsletter_deliveries', 'claimed_at')
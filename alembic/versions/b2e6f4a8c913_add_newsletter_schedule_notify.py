@@ -0,0 +1,33 @@
+"""add_newsletter_schedule_notify
+Revision ID: b2e6f4a8c913
+Revises: 9a1d5e3b7f24
+Create Date: 2026-10-18 16:02:47.215093
+"""
+from typing import Sequence, Union
+from alembic import op
+revision: str = 'b2e6f4a8c913'
+down_revision: Union[str, Sequence[str], None] = '9a1d5e3b7f24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_newsletter_schedule() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.status = 'SCHEDULED'
+               OR (TG_OP = 'UPDATE' AND OLD.status = 'SCHEDULED') THEN
+                PERFORM pg_notify('newsletter_schedule', NEW.id::text);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER newsletter_schedule_notify
+        AFTER INSERT OR UPDATE OF status, scheduled_at ON newsletters
+        FOR EACH ROW EXECUTE FUNCTION notify_newsletter_schedule()
+    """)
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS newsletter_schedule_notify ON newsletters")
+    op.execute("DROP FUNCTION IF EXISTS notify_newsletter_schedule()")
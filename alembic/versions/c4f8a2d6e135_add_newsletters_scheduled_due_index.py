@@ -0,0 +1,18 @@
+"""add_newsletters_scheduled_due_index
+Revision ID: c4f8a2d6e135
+Revises: b2e6f4a8c913
+Create Date: 2026-10-18 16:41:09.530128
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+revision: str = 'c4f8a2d6e135'
+down_revision: Union[str, Sequence[str], None] = 'b2e6f4a8c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_newsletters_scheduled_due', 'newsletters', ['scheduled_at'], unique=False, postgresql_where=sa.text("status = 'SCHEDULED'"))
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_newsletters_scheduled_due', table_name='newsletters', postgresql_where=sa.text("status = 'SCHEDULED'"))
@@ -0,0 +1,22 @@
+"""add_newsletter_claims
+Revision ID: d7a3c9e5f246
+Revises: c4f8a2d6e135
+Create Date: 2026-10-18 17:20:55.118402
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+revision: str = 'd7a3c9e5f246'
+down_revision: Union[str, Sequence[str], None] = 'c4f8a2d6e135'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('newsletters', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+    op.add_column('newsletters', sa.Column('claimed_by', sa.String(), nullable=True))
+    op.create_index('ix_newsletters_in_progress', 'newsletters', ['claimed_at'], unique=False, postgresql_where=sa.text("status IN ('PENDING', 'SENDING')"))
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_newsletters_in_progress', table_name='newsletters', postgresql_where=sa.text("status IN ('PENDING', 'SENDING')"))
+    op.drop_column('newsletters', 'claimed_by')
+    op.drop_column('newsletters', 'claimed_at')
@@ -1,20 +1,21 @@
 import asyncio
 
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+from aiogram import Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
-from decouple import config
-from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from handlers import admin, common, moderator, register
-from middlewares.auth import DbSessionMiddleware
+from middlewares.auth import CurrentUserMiddleware, DbSessionMiddleware
 from models.database import AsyncSessionLocal, Base, engine
 from models.models import Role
+from services.background import background_tasks
+from services.role_cache import role_cache
 from services.scheduler import start_newsletter_scheduler, stop_newsletter_scheduler
 from services.user_service import get_role_by_name
 from utils.logger import get_logger
+from utils.redis import REDIS_URL, get_redis
+from utils.serialization import JSON_BACKEND, json_dumps, json_loads
+from utils.telegram import create_bot
 
 ROLES = ["user", "moderator", "admin"]
 logger = get_logger(__name__)
@@ -31,20 +32,19 @@ async def main() -> None:
         await conn.run_sync(Base.metadata.create_all)
     async with AsyncSessionLocal() as session:
         await create_default_roles(session)
-    redis_url = config("REDIS_URL", default="redis://redis:6379/0")
-    logger.info(f"Подключение к Redis: {redis_url}")
-    redis = Redis.from_url(redis_url, decode_responses=True)
-    storage = RedisStorage(redis)
-    bot = Bot(
-        token=config("BOT_TOKEN"),
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-    )
+    logger.info(f"Подключение к Redis: {REDIS_URL}")
+    redis = get_redis()
+    storage = RedisStorage(redis, json_loads=json_loads, json_dumps=json_dumps)
+    logger.info(f"JSON-сериализация: {JSON_BACKEND}")
+    bot = create_bot()
     dp = Dispatcher(storage=storage)
     dp.update.middleware(DbSessionMiddleware(session_pool=AsyncSessionLocal))
+    dp.update.middleware(CurrentUserMiddleware())
     dp.include_router(common.router)
     dp.include_router(admin.router)
     dp.include_router(moderator.router)
     dp.include_router(register.router)
+    background_tasks.spawn(role_cache.listen(), name="role-cache-invalidation")
     logger.info("Запуск планировщика рассылок...")
     await start_newsletter_scheduler(bot)
     try:
@@ -52,6 +52,8 @@ async def main() -> None:
         logger.info("Бот запущен и готов к работе!")
         await dp.start_polling(bot)
     finally:
+        logger.info("Остановка фоновых рассылок...")
+        await background_tasks.shutdown()
         logger.info("Остановка планировщика рассылок...")
         await stop_newsletter_scheduler()
         await redis.close()
@@ -8,8 +8,12 @@ from sqlalchemy.orm import selectinload
 
 from keyboards.inline import get_role_selection_keyboard
 from middlewares.auth import IsAdmin
+from models.database import get_pool_stats
 from models.models import Newsletter, NewsletterStatusEnum, User
-from services.newsletter_service import get_newsletter_stats
+from services.delivery_stats import ERROR_CLASSES
+from services.newsletter_service import format_error_breakdown, get_newsletter_stats
+from services.progress import DeliveryProgress, format_progress
+from services.role_cache import role_cache
 from services.user_service import get_role_by_name
 from states.admin import SetRoleState
 from utils.logger import get_logger
@@ -17,19 +21,37 @@ from utils.logger import get_logger
 router = Router()
 logger = get_logger(__name__)
 
-router.message.filter(IsAdmin())
-router.callback_query.filter(IsAdmin())
 
-
-@router.message(Command("stats"))
+@router.message(Command("stats"), IsAdmin())
 async def get_stats(message: Message, session: AsyncSession):
     query = select(func.count(User.id))
     result = await session.execute(query)
     user_count = result.scalar_one()
-    await message.answer(f"Всего пользователей в боте: {user_count}")
+    text = f"Всего пользователей в боте: {user_count}"
+    pool_stats = getattr(message.bot.session, "pool_stats", None)
+    if pool_stats:
+        text += (
+            f"\n\nПул соединений Bot API:\n"
+            f"• Занято: {pool_stats.in_flight} из {pool_stats.limit} "
+            f"({pool_stats.utilisation:.0%})\n"
+            f"• Ждут соединения: {pool_stats.waiting} "
+            f"(всего {pool_stats.queued}, {pool_stats.queued_seconds:.1f} с)\n"
+            f"• Соединений открыто: {pool_stats.connections_created}, "
+            f"переиспользовано: {pool_stats.connections_reused}"
+        )
+    db_pool = get_pool_stats()
+    text += (
+        f"\n\nПул соединений БД:\n"
+        f"• Занято: {db_pool['in_use']}, свободно: {db_pool['idle']} "
+        f"(размер {db_pool['size']} + до {db_pool['max_overflow']} сверх)\n"
+        f"• Выдач соединения: {db_pool['checkouts']}, ожидание: "
+        f"среднее {db_pool['avg_wait_ms']:.1f} мс, "
+        f"максимум {db_pool['max_wait_ms']:.1f} мс"
+    )
+    await message.answer(text)
 
 
-@router.message(Command("setrole"))
+@router.message(Command("setrole"), IsAdmin())
 async def start_set_role(message: Message, state: FSMContext):
     logger.info(f"Администратор {message.from_user.id} инициировал смену роли.")
     await state.set_state(SetRoleState.waiting_for_user_id)
@@ -38,7 +60,7 @@ async def start_set_role(message: Message, state: FSMContext):
     )
 
 
-@router.message(SetRoleState.waiting_for_user_id, F.text)
+@router.message(SetRoleState.waiting_for_user_id, F.text, IsAdmin())
 async def user_id_received(message: Message, session: AsyncSession, state: FSMContext):
     if not message.text.isdigit():
         await message.answer("Telegram ID должен быть числом. Попробуйте еще раз.")
@@ -64,7 +86,9 @@ async def user_id_received(message: Message, session: AsyncSession, state: FSMCo
 
 
 @router.callback_query(
-    SetRoleState.waiting_for_role_selection, F.data.startswith("role_")
+    SetRoleState.waiting_for_role_selection,
+    F.data.startswith("role_"),
+    IsAdmin(),
 )
 async def role_for_user_selected(
     callback: CallbackQuery, session: AsyncSession, state: FSMContext
@@ -92,6 +116,7 @@ async def role_for_user_selected(
     user_to_update.role_id = new_role.id
     session.add(user_to_update)
     await session.commit()
+    await role_cache.invalidate(target_user_id)
     logger.info(
         f"Роль для пользователя {target_user_id} успешно обновлена на '{new_role_name}'."
     )
@@ -102,7 +127,7 @@ async def role_for_user_selected(
     await callback.answer()
 
 
-@router.message(Command("newsletters"))
+@router.message(Command("newsletters"), IsAdmin())
 async def view_newsletters(message: Message, session: AsyncSession):
     stats = await get_newsletter_stats(session)
     result = await session.execute(
@@ -142,7 +167,7 @@ async def view_newsletters(message: Message, session: AsyncSession):
     await message.answer(text, parse_mode="HTML")
 
 
-@router.message(Command("newsletter"))
+@router.message(Command("newsletter"), IsAdmin())
 async def view_specific_newsletter(message: Message, session: AsyncSession):
     command_parts = message.text.split()
     if len(command_parts) != 2 or not command_parts[1].isdigit():
@@ -157,7 +182,7 @@ async def view_specific_newsletter(message: Message, session: AsyncSession):
     newsletter_id = int(command_parts[1])
     result = await session.execute(
         select(Newsletter)
-        .options(selectinload(Newsletter.creator))
+        .options(selectinload(Newsletter.creator), selectinload(Newsletter.stats))
         .where(Newsletter.id == newsletter_id)
     )
     newsletter = result.scalar_one_or_none()
@@ -185,4 +210,25 @@ async def view_specific_newsletter(message: Message, session: AsyncSession):
         newsletter.status, ("❓", newsletter.status.value)
     )
     text += f"📊 <b>Статус:</b> {emoji} {status_text}\n"
+    if newsletter.status == NewsletterStatusEnum.SENDING:
+        try:
+            progress = await DeliveryProgress().get(newsletter.id)
+        except Exception as e:
+            logger.warning(
+                f"Не удалось получить прогресс рассылки {newsletter.id}: {e}"
+            )
+            progress = None
+        if progress:
+            text += "\n📡 <b>Прогресс отправки:</b>\n" + format_progress(progress)
+    if newsletter.stats:
+        stats = newsletter.stats
+        text += (
+            f"\n📈 <b>Итоги доставки:</b>\n"
+            f"• Всего получателей: {stats.total}\n"
+            f"• Доставлено: {stats.success}\n"
+            f"• Не доставлено: {stats.failed}\n"
+        )
+        text += format_error_breakdown(
+            {error_class: getattr(stats, error_class) for error_class in ERROR_CLASSES}
+        )
     await message.answer(text, parse_mode="HTML")
@@ -5,30 +5,31 @@ from aiogram.types import Message
 from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
-from models.models import Newsletter, User
+from middlewares.auth import CurrentUser
+from models.models import Newsletter
+from services.user_service import restore_user_reachability
 from states.register import RegisterState
 from utils.logger import get_logger
 
 router = Router()
 logger = get_logger(__name__)
 @router.message(Command("start"))
-async def start_command(message: Message, session: AsyncSession, state: FSMContext):
+async def start_command(
+    message: Message,
+    session: AsyncSession,
+    state: FSMContext,
+    current_user: CurrentUser,
+):
     user_id = message.from_user.id
     logger.info(f"Пользователь {user_id} вызвал команду /start.")
     await state.clear()
-    query = (
-        select(User)
-        .options(selectinload(User.role))
-        .filter(User.telegram_id == user_id)
-    )
-    result = await session.execute(query)
-    existing_user = result.scalar_one_or_none()
+    existing_user = await current_user.get()
     if existing_user:
         logger.info(
             f"Пользователь {user_id} уже зарегистрирован. Пропускаем регистрацию."
         )
+        await restore_user_reachability(session, existing_user)
         await message.answer(
             f"С возвращением, {message.from_user.full_name}! Вы — {existing_user.role.name}."
         )
@@ -40,15 +41,16 @@ async def start_command(message: Message, session: AsyncSession, state: FSMConte
     )
 @router.message(Command("reregister"))
 async def reregister_command(
-    message: Message, session: AsyncSession, state: FSMContext
+    message: Message,
+    session: AsyncSession,
+    state: FSMContext,
+    current_user: CurrentUser,
 ):
     user_id = message.from_user.id
     logger.info(f"Пользователь {user_id} инициировал перерегистрацию.")
     await state.clear()
     logger.info(f"Состояние для пользователя {user_id} очищено.")
-    query = select(User).filter(User.telegram_id == user_id)
-    result = await session.execute(query)
-    existing_user = result.scalar_one_or_none()
+    existing_user = await current_user.get()
     if existing_user:
         newsletters_check = await session.execute(
             select(func.count(Newsletter.id)).where(
@@ -1,9 +1,12 @@
+import asyncio
 import datetime
 
 from aiogram import F, Router, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from keyboards.inline import (
@@ -13,7 +16,8 @@ from keyboards.inline import (
     get_media_actions_keyboard,
     get_schedule_keyboard,
 )
-from middlewares.auth import IsModerator
+from middlewares.auth import CurrentUser, IsModerator
+from models.database import AsyncSessionLocal
 from models.models import (
     ButtonTypeEnum,
     ContentTypeEnum,
@@ -23,20 +27,23 @@ from models.models import (
     NewsletterStatusEnum,
     TargetAudienceEnum,
 )
-from services.newsletter_service import NewsletterService
-from services.user_service import get_user_by_telegram_id
+from services.background import background_tasks
+from services.newsletter_service import REPLICA_ID
+from services.progress import DeliveryProgress, format_progress
+from services.scheduler import wake_newsletter_scheduler
 from states.moderator import CreateNewsletter
+from utils.logger import get_logger
 
+PROGRESS_EDIT_INTERVAL = 5
 router = Router()
-router.message.filter(IsModerator())
-router.callback_query.filter(IsModerator())
-@router.message(Command("create_newsletter"))
+logger = get_logger(__name__)
+@router.message(Command("create_newsletter"), IsModerator())
 async def start_newsletter(message: Message, state: FSMContext):
     await state.set_state(CreateNewsletter.waiting_for_text)
     await message.answer(
         "Введите текст для рассылки. Вы можете использовать форматирование Telegram (жирный, курсив и т.д.)."
     )
-@router.message(CreateNewsletter.waiting_for_text, F.text)
+@router.message(CreateNewsletter.waiting_for_text, F.text, IsModerator())
 async def newsletter_text_received(message: Message, state: FSMContext):
     await state.update_data(text=message.html_text)
     await state.set_state(CreateNewsletter.waiting_for_content_type)
@@ -45,7 +52,9 @@ async def newsletter_text_received(message: Message, state: FSMContext):
         reply_markup=get_content_type_keyboard(),
     )
 @router.callback_query(
-    CreateNewsletter.waiting_for_content_type, F.data.startswith("content_type_")
+    CreateNewsletter.waiting_for_content_type,
+    F.data.startswith("content_type_"),
+    IsModerator(),
 )
 async def content_type_selected(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
@@ -67,7 +76,7 @@ async def content_type_selected(callback: types.CallbackQuery, state: FSMContext
         }
         instruction = media_instructions.get(content_type, "Отправьте медиафайл")
         await callback.message.edit_text(instruction)
-@router.message(CreateNewsletter.waiting_for_media, F.photo)
+@router.message(CreateNewsletter.waiting_for_media, F.photo, IsModerator())
 async def photo_received(message: Message, state: FSMContext):
     data = await state.get_data()
     if data.get("content_type") != "photo":
@@ -85,7 +94,7 @@ async def photo_received(message: Message, state: FSMContext):
         "✅ Фотография загружена! Теперь выберите аудиторию:",
         reply_markup=get_audience_selection_keyboard(),
     )
-@router.message(CreateNewsletter.waiting_for_media, F.video)
+@router.message(CreateNewsletter.waiting_for_media, F.video, IsModerator())
 async def video_received(message: Message, state: FSMContext):
     data = await state.get_data()
     if data.get("content_type") != "video":
@@ -105,7 +114,7 @@ async def video_received(message: Message, state: FSMContext):
         "✅ Видео загружено! Теперь выберите аудиторию:",
         reply_markup=get_audience_selection_keyboard(),
     )
-@router.message(CreateNewsletter.waiting_for_media, F.animation)
+@router.message(CreateNewsletter.waiting_for_media, F.animation, IsModerator())
 async def animation_received(message: Message, state: FSMContext):
     data = await state.get_data()
     if data.get("content_type") != "animation":
@@ -125,7 +134,7 @@ async def animation_received(message: Message, state: FSMContext):
         "✅ GIF загружен! Теперь выберите аудиторию:",
         reply_markup=get_audience_selection_keyboard(),
     )
-@router.message(CreateNewsletter.waiting_for_media, F.document)
+@router.message(CreateNewsletter.waiting_for_media, F.document, IsModerator())
 async def document_received(message: Message, state: FSMContext):
     data = await state.get_data()
     if data.get("content_type") != "document":
@@ -145,7 +154,7 @@ async def document_received(message: Message, state: FSMContext):
         "✅ Документ загружен! Теперь выберите аудиторию:",
         reply_markup=get_audience_selection_keyboard(),
     )
-@router.message(CreateNewsletter.waiting_for_media)
+@router.message(CreateNewsletter.waiting_for_media, IsModerator())
 async def wrong_media_type(message: Message, state: FSMContext):
     """Обрабатывает неправильный тип медиафайла"""
     data = await state.get_data()
@@ -161,7 +170,9 @@ async def wrong_media_type(message: Message, state: FSMContext):
     )
     await message.answer(error_msg)
 @router.callback_query(
-    CreateNewsletter.waiting_for_audience, F.data.startswith("audience_")
+    CreateNewsletter.waiting_for_audience,
+    F.data.startswith("audience_"),
+    IsModerator(),
 )
 async def audience_selected(callback: types.CallbackQuery, state: FSMContext):
     """
@@ -178,6 +189,7 @@ async def audience_selected(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(
     CreateNewsletter.waiting_for_inline_buttons,
     F.data.in_(["add_buttons", "skip_buttons"]),
+    IsModerator(),
 )
 async def buttons_action_selected(callback: types.CallbackQuery, state: FSMContext):
     """
@@ -199,7 +211,9 @@ async def buttons_action_selected(callback: types.CallbackQuery, state: FSMConte
             "Кнопки пропущены. Теперь выберите, когда отправить рассылку:",
             reply_markup=get_schedule_keyboard(),
         )
-@router.message(CreateNewsletter.waiting_for_inline_buttons, F.text)
+@router.message(
+    CreateNewsletter.waiting_for_inline_buttons, F.text, IsModerator()
+)
 async def button_received(message: Message, state: FSMContext):
     """
     Получает данные для новой кнопки
@@ -240,6 +254,7 @@ async def button_received(message: Message, state: FSMContext):
 @router.callback_query(
     CreateNewsletter.waiting_for_inline_buttons,
     F.data.in_(["add_new_button", "finish_buttons", "remove_last_button"]),
+    IsModerator(),
 )
 async def manage_buttons_action(callback: types.CallbackQuery, state: FSMContext):
     """
@@ -292,10 +307,15 @@ async def manage_buttons_action(callback: types.CallbackQuery, state: FSMContext
         await callback.message.edit_text("❌ Неизвестное действие с кнопками.")
         await state.clear()
 @router.callback_query(
-    CreateNewsletter.waiting_for_schedule, F.data.startswith("schedule_")
+    CreateNewsletter.waiting_for_schedule,
+    F.data.startswith("schedule_"),
+    IsModerator(),
 )
 async def schedule_selected(
-    callback: types.CallbackQuery, state: FSMContext, session: AsyncSession
+    callback: types.CallbackQuery,
+    state: FSMContext,
+    session: AsyncSession,
+    current_user: CurrentUser,
 ):
     """
     Обрабатывает выбор времени отправки.
@@ -303,7 +323,7 @@ async def schedule_selected(
     await callback.answer()
     schedule_type = callback.data.split("_")[1]
     data = await state.get_data()
-    user = await get_user_by_telegram_id(session, callback.from_user.id)
+    user = await current_user.get()
     if not user:
         await callback.message.edit_text("Ошибка: не удалось вас идентифицировать.")
         await state.clear()
@@ -354,6 +374,8 @@ async def schedule_selected(
             content_type=content_type_enum,
             status=NewsletterStatusEnum.PENDING,
             scheduled_at=datetime.datetime.now(),
+            claimed_at=datetime.datetime.now(),
+            claimed_by=REPLICA_ID,
         )
         session.add(newsletter)
         try:
@@ -388,6 +410,11 @@ async def schedule_selected(
                 print(
                     f"DEBUG: Сохранено {len(buttons)} кнопок для рассылки {newsletter.id}"
                 )
+            # Аренда держала рассылку, пока сохранялись медиа и кнопки; снятая
+            # аренда отдает ее планировщику в общий лимит параллельных рассылок
+            newsletter.claimed_at = None
+            newsletter.claimed_by = None
+            await session.commit()
         except Exception as e:
             print(f"DEBUG: Ошибка сохранения рассылки или медиафайла: {e}")
             await callback.message.edit_text(
@@ -396,35 +423,80 @@ async def schedule_selected(
             await state.clear()
             return
         await state.clear()
-        newsletter_service = NewsletterService(callback.bot)
+        wake_newsletter_scheduler()
         await callback.message.edit_text(
-            "📤 Начинаем отправку рассылки...\nЭто может занять некоторое время."
+            "📤 Рассылка поставлена в очередь на отправку...\n"
+            "Это может занять некоторое время."
+        )
+        background_tasks.spawn(
+            watch_newsletter_progress(callback.message, newsletter.id),
+            name=f"newsletter-progress-{newsletter.id}",
         )
-        try:
-            stats = await newsletter_service.send_newsletter(session, newsletter.id)
-            await callback.message.edit_text(
-                f"✅ <b>Рассылка завершена!</b>\n\n"
-                f"📝 <b>Текст:</b> {data.get('text')[:50]}{'...' if len(data.get('text')) > 50 else ''}\n"
-                f"👥 <b>Аудитория:</b> {audience_str}\n\n"
-                f"📊 <b>Статистика:</b>\n"
-                f"• Всего пользователей: {stats['total']}\n"
-                f"• Успешно доставлено: ✅ {stats['success']}\n"
-                f"• Не доставлено: ❌ {stats['failed']}\n\n"
-                f"⏰ <b>Время завершения:</b> {datetime.datetime.now().strftime('%d.%m.%Y %H:%M')}",
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            await callback.message.edit_text(
-                f"❌ Ошибка при отправке рассылки: {str(e)}"
-            )
     else:
         await state.set_state(CreateNewsletter.waiting_for_schedule_datetime)
         await callback.message.edit_text(
             "Введите дату и время для отправки рассылки в формате: `ДД.ММ.ГГГГ ЧЧ:ММ`"
         )
-@router.message(CreateNewsletter.waiting_for_schedule_datetime, F.text)
+async def watch_newsletter_progress(message: Message, newsletter_id: int):
+    """
+    Показывает модератору прогресс рассылки, которую отправляет планировщик,
+    пока она не завершится. Отчет со статистикой планировщик присылает сам.
+    """
+    progress_task = asyncio.create_task(show_send_progress(message, newsletter_id))
+    status = NewsletterStatusEnum.PENDING
+    try:
+        while status in (NewsletterStatusEnum.PENDING, NewsletterStatusEnum.SENDING):
+            await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+            try:
+                async with AsyncSessionLocal() as session:
+                    status = await session.scalar(
+                        select(Newsletter.status).where(Newsletter.id == newsletter_id)
+                    )
+            except Exception as e:
+                logger.warning(
+                    f"Не удалось проверить статус рассылки {newsletter_id}: {e}"
+                )
+    finally:
+        progress_task.cancel()
+    if status == NewsletterStatusEnum.SENT:
+        text = "✅ <b>Рассылка завершена!</b>\nОтчет со статистикой придет отдельным сообщением."
+    else:
+        text = "⚠️ Отправка рассылки прервана, она будет повторена автоматически."
+    try:
+        await message.edit_text(text, parse_mode="HTML")
+    except TelegramBadRequest:
+        pass
+async def show_send_progress(message: Message, newsletter_id: int):
+    """
+    Обновляет сообщение модератора прогрессом отправки не чаще, чем раз
+    в PROGRESS_EDIT_INTERVAL секунд.
+    """
+    progress = DeliveryProgress()
+    last_text = None
+    while True:
+        await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+        try:
+            snapshot = await progress.get(newsletter_id)
+            if not snapshot:
+                continue
+            text = "📤 <b>Идет отправка рассылки...</b>\n\n" + format_progress(snapshot)
+            if text != last_text:
+                await message.edit_text(text, parse_mode="HTML")
+                last_text = text
+        except TelegramBadRequest:
+            pass
+        except Exception as e:
+            logger.warning(
+                f"Не удалось показать прогресс рассылки {newsletter_id}: {e}"
+            )
+@router.message(
+    CreateNewsletter.waiting_for_schedule_datetime, F.text, IsModerator()
+)
 async def schedule_datetime_received(
-    message: Message, state: FSMContext, session: AsyncSession
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    current_user: CurrentUser,
 ):
     try:
         scheduled_dt = datetime.datetime.strptime(message.text, "%d.%m.%Y %H:%M")
@@ -446,7 +518,7 @@ async def schedule_datetime_received(
         )
         return
     data = await state.get_data()
-    user = await get_user_by_telegram_id(session, message.from_user.id)
+    user = await current_user.get()
     if not user:
         await message.answer("Ошибка: не удалось вас идентифицировать.")
         await state.clear()
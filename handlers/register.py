@@ -5,10 +5,10 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from keyboards.inline import get_role_selection_keyboard
+from middlewares.auth import CurrentUser
 from services.user_service import (
     create_user,
     get_role_by_name,
-    get_user_by_telegram_id,
     update_user,
 )
 from states.register import RegisterState
@@ -35,7 +35,10 @@ async def email_received(message: Message, state: FSMContext):
     )
 @router.callback_query(RegisterState.role, F.data.startswith("role_"))
 async def role_selected(
-    callback: CallbackQuery, session: AsyncSession, state: FSMContext
+    callback: CallbackQuery,
+    session: AsyncSession,
+    state: FSMContext,
+    current_user: CurrentUser,
 ):
     role_name = callback.data.split("_")[1]
     logger.info(f"Пользователь {callback.from_user.id} выбрал роль: {role_name}")
@@ -49,7 +52,7 @@ async def role_selected(
         await callback.message.answer("Произошла ошибка. Попробуйте снова.")
         return
     try:
-        existing_user = await get_user_by_telegram_id(session, callback.from_user.id)
+        existing_user = await current_user.get()
         if existing_user:
             logger.info(
                 f"Обновление данных существующего пользователя {callback.from_user.id}"
@@ -59,6 +62,7 @@ async def role_selected(
                 telegram_id=callback.from_user.id,
                 email=email,
                 role=role,
+                user=existing_user,
             )
             message_text = f"Ваши данные успешно обновлены! Теперь вы {role.name}."
         else:
@@ -3,15 +3,30 @@ from typing import Any
 
 from aiogram import BaseMiddleware
 from aiogram.filters import Filter
-from aiogram.types import Message
+from aiogram.types import Message, TelegramObject
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 from models.models import User
+from services.role_cache import role_cache
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
+class LazySession:
+    """Заместитель AsyncSession: сессия создается при первом обращении,
+    соединение из пула берется только при первом запросе к БД"""
+    def __init__(self, session_pool):
+        self._session_pool = session_pool
+        self._session: AsyncSession | None = None
+    def __getattr__(self, name: str) -> Any:
+        if self._session is None:
+            self._session = self._session_pool()
+        return getattr(self._session, name)
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 class DbSessionMiddleware(BaseMiddleware):
     def __init__(self, session_pool):
         super().__init__()
@@ -22,26 +37,70 @@ class DbSessionMiddleware(BaseMiddleware):
         event: Message,
         data: dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session:
-            data["session"] = session
+        session = LazySession(self.session_pool)
+        data["session"] = session
+        try:
             return await handler(event, data)
+        finally:
+            await session.close()
+class CurrentUser:
+    """Автор апдейта: пользователь с ролью загружается из БД не больше одного
+    раза за апдейт и только если его запросил фильтр или обработчик"""
+    def __init__(self, session: AsyncSession, telegram_id: int):
+        self.session = session
+        self.telegram_id = telegram_id
+        self.denied_logged = False
+        self._user: User | None = None
+        self._user_loaded = False
+        self._role: str | None = None
+        self._role_loaded = False
+    async def get(self) -> User | None:
+        if not self._user_loaded:
+            result = await self.session.execute(
+                select(User)
+                .options(selectinload(User.role))
+                .filter(User.telegram_id == self.telegram_id)
+            )
+            self._user = result.scalar_one_or_none()
+            self._user_loaded = True
+        return self._user
+    async def role(self) -> str | None:
+        if self._user_loaded:
+            return self._user.role.name if self._user else None
+        # Для проверки прав хватает кэша ролей, пользователь из БД не нужен
+        if not self._role_loaded:
+            self._role = await role_cache.get_role(self.session, self.telegram_id)
+            self._role_loaded = True
+        return self._role
+class CurrentUserMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[Message, dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["current_user"] = CurrentUser(data["session"], user.id) if user else None
+        return await handler(event, data)
 class RoleFilter(Filter):
+    """Ставится последним фильтром обработчика, а не на весь роутер: апдейты
+    чужих сценариев отсеиваются командой или состоянием без запроса роли"""
     def __init__(self, allowed_roles: list[str]):
         self.allowed_roles = allowed_roles
-    async def __call__(self, message: Message, session: AsyncSession) -> bool:
-        query = (
-            select(User)
-            .options(selectinload(User.role))
-            .filter(User.telegram_id == message.from_user.id)
-        )
-        result = await session.execute(query)
-        user: User | None = result.scalar_one_or_none()
-        if user and user.role and user.role.name in self.allowed_roles:
+    async def __call__(
+        self, event: TelegramObject, current_user: CurrentUser | None
+    ) -> bool:
+        if current_user is None:
+            return False
+        role = await current_user.role()
+        if role in self.allowed_roles:
             return True
-        logger.warning(
-            f"Пользователь {message.from_user.id} (роль: {user.role.name if user and user.role else 'None'}) "
-            f"попытался выполнить команду, требующую одну из ролей: {self.allowed_roles}"
-        )
+        if not current_user.denied_logged:
+            current_user.denied_logged = True
+            logger.warning(
+                f"Пользователь {current_user.telegram_id} (роль: {role}) "
+                f"попытался выполнить команду, требующую одну из ролей: {self.allowed_roles}"
+            )
         return False
 class IsAdmin(RoleFilter):
     def __init__(self):
@@ -1,13 +1,57 @@
+import time
+
 from decouple import config
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = config(
     "DATABASE_URL", default="postgresql+asyncpg://postgres:password@db:5432/mydatabase"
 )
+DB_PROFILES = {
+    "dev": {"echo": True, "pool_size": 5, "max_overflow": 5},
+    "prod": {"echo": False, "pool_size": 20, "max_overflow": 10},
+}
+DB_PROFILE = DB_PROFILES[config("DB_PROFILE", default="prod")]
+DB_ECHO = config("DB_ECHO", default=DB_PROFILE["echo"], cast=bool)
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=DB_PROFILE["pool_size"], cast=int)
+DB_MAX_OVERFLOW = config(
+    "DB_MAX_OVERFLOW", default=DB_PROFILE["max_overflow"], cast=int
+)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=1800, cast=int)
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=True, cast=bool)
+DB_STATEMENT_TIMEOUT_MS = config("DB_STATEMENT_TIMEOUT_MS", default=60000, cast=int)
+class PoolTelemetry:
+    """Счетчики ожидания свободного соединения в пуле"""
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    def record(self, waited: float):
+        self.checkouts += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+pool_telemetry = PoolTelemetry()
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_telemetry.record(time.perf_counter() - started)
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,
+    echo=DB_ECHO,
+    poolclass=InstrumentedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={
+        "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    },
 )
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -15,3 +59,17 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 Base = declarative_base()
+def get_pool_stats() -> dict:
+    pool = engine.pool
+    checkouts = pool_telemetry.checkouts
+    avg_wait = pool_telemetry.wait_seconds / checkouts if checkouts else 0.0
+    return {
+        "size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": checkouts,
+        "avg_wait_ms": avg_wait * 1000,
+        "max_wait_ms": pool_telemetry.max_wait_seconds * 1000,
+    }
@@ -21,3 +21,7 @@ class ContentTypeEnum(enum.Enum):
 class ButtonTypeEnum(enum.Enum):
     URL = "url"
     CALLBACK = "callback"
+class DeliveryStatusEnum(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
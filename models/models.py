@@ -6,6 +6,7 @@ from .database import Base
 from .enums import (
     ButtonTypeEnum,
     ContentTypeEnum,
+    DeliveryStatusEnum,
     NewsletterStatusEnum,
     TargetAudienceEnum,
 )
@@ -14,6 +15,7 @@ target_audience_enum = ENUM(TargetAudienceEnum, name="targetaudienceenum")
 newsletter_status_enum = ENUM(NewsletterStatusEnum, name="newsletterstatusenum")
 content_type_enum = ENUM(ContentTypeEnum, name="contenttypeenum")
 button_type_enum = ENUM(ButtonTypeEnum, name="buttontypeenum")
+delivery_status_enum = ENUM(DeliveryStatusEnum, name="deliverystatusenum")
 class Role(Base):
     __tablename__ = "ROLES"
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
@@ -22,16 +24,39 @@ class Role(Base):
     users: Mapped[list["User"]] = relationship(back_populates="role")
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        sa.Index(
+            "ix_users_reachable_id",
+            "id",
+            postgresql_where=sa.text("is_reachable"),
+        ),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     email: Mapped[str] = mapped_column(sa.String, unique=True, index=True)
     telegram_id: Mapped[int] = mapped_column(sa.BigInteger, unique=True, index=True)
     role_id: Mapped[int] = mapped_column(sa.ForeignKey("ROLES.id"))
+    is_reachable: Mapped[bool] = mapped_column(
+        sa.Boolean, default=True, server_default=sa.true()
+    )
+    blocked_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime, nullable=True)
     role: Mapped["Role"] = relationship(back_populates="users")
     created_newsletters: Mapped[list["Newsletter"]] = relationship(
         back_populates="creator"
     )
 class Newsletter(Base):
     __tablename__ = "newsletters"
+    __table_args__ = (
+        sa.Index(
+            "ix_newsletters_scheduled_due",
+            "scheduled_at",
+            postgresql_where=sa.text("status = 'SCHEDULED'"),
+        ),
+        sa.Index(
+            "ix_newsletters_in_progress",
+            "claimed_at",
+            postgresql_where=sa.text("status IN ('PENDING', 'SENDING')"),
+        ),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     creator_id: Mapped[int] = mapped_column(sa.ForeignKey("users.id"))
     text: Mapped[str] = mapped_column(sa.Text, nullable=True)
@@ -48,6 +73,8 @@ class Newsletter(Base):
         nullable=False,
         server_default="TEXT",
     )
+    claimed_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime, nullable=True)
+    claimed_by: Mapped[str] = mapped_column(sa.String, nullable=True)
     creator: Mapped["User"] = relationship(back_populates="created_newsletters")
     media_files: Mapped[list["NewsletterMedia"]] = relationship(
         back_populates="newsletter", cascade="all, delete-orphan"
@@ -55,6 +82,9 @@ class Newsletter(Base):
     inline_buttons: Mapped[list["NewsletterButton"]] = relationship(
         back_populates="newsletter", cascade="all, delete-orphan"
     )
+    stats: Mapped["NewsletterStats"] = relationship(
+        back_populates="newsletter", cascade="all, delete-orphan", uselist=False
+    )
 class NewsletterMedia(Base):
     __tablename__ = "newsletter_media"
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
@@ -93,3 +123,45 @@ class NewsletterButton(Base):
         sa.Integer, default=0
     )
     newsletter: Mapped["Newsletter"] = relationship(back_populates="inline_buttons")
+class NewsletterDelivery(Base):
+    __tablename__ = "newsletter_deliveries"
+    __table_args__ = (
+        sa.UniqueConstraint(
+            "newsletter_id", "chat_id", name="uq_newsletter_deliveries_chat"
+        ),
+        sa.Index(
+            "ix_newsletter_deliveries_pending",
+            "newsletter_id",
+            "id",
+            postgresql_where=sa.text("status = 'PENDING'"),
+        ),
+    )
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True)
+    newsletter_id: Mapped[int] = mapped_column(
+        sa.ForeignKey("newsletters.id", ondelete="CASCADE")
+    )
+    chat_id: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    status: Mapped[DeliveryStatusEnum] = mapped_column(
+        delivery_status_enum,
+        nullable=False,
+        server_default="PENDING",
+    )
+    error: Mapped[str] = mapped_column(sa.String, nullable=True)
+    updated_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime, nullable=True)
+    claimed_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime, nullable=True)
+class NewsletterStats(Base):
+    __tablename__ = "newsletter_stats"
+    newsletter_id: Mapped[int] = mapped_column(
+        sa.ForeignKey("newsletters.id", ondelete="CASCADE"), primary_key=True
+    )
+    total: Mapped[int] = mapped_column(sa.Integer, default=0)
+    success: Mapped[int] = mapped_column(sa.Integer, default=0)
+    failed: Mapped[int] = mapped_column(sa.Integer, default=0)
+    blocked: Mapped[int] = mapped_column(sa.Integer, default=0)
+    chat_not_found: Mapped[int] = mapped_column(sa.Integer, default=0)
+    bad_request: Mapped[int] = mapped_column(sa.Integer, default=0)
+    retry_exhausted: Mapped[int] = mapped_column(sa.Integer, default=0)
+    unexpected: Mapped[int] = mapped_column(sa.Integer, default=0)
+    error_samples: Mapped[dict] = mapped_column(sa.JSON, nullable=True)
+    finished_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime, nullable=True)
+    newsletter: Mapped["Newsletter"] = relationship(back_populates="stats")
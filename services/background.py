@@ -0,0 +1,35 @@
+import asyncio
+from collections.abc import Coroutine
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BackgroundTasks:
+    """Реестр фоновых задач: хранит ссылки на задачи и отменяет их при остановке"""
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+
+    def spawn(self, coro: Coroutine, name: str | None = None) -> asyncio.Task:
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(
+                f"Фоновая задача {task.get_name()} завершилась с ошибкой: "
+                f"{task.exception()}"
+            )
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+background_tasks = BackgroundTasks()
@@ -0,0 +1,104 @@
+import asyncio
+from collections.abc import AsyncIterable, Awaitable, Callable
+
+from aiogram.exceptions import TelegramRetryAfter
+from decouple import config
+
+from services.outbound import Priority, outbound_priority
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+NEWSLETTER_CONCURRENCY = config("NEWSLETTER_CONCURRENCY", default=20, cast=int)
+NEWSLETTER_MAX_RETRIES = config("NEWSLETTER_MAX_RETRIES", default=3, cast=int)
+
+
+class DeliveryEngine:
+    """Пул конкурентных отправителей. Скорость ограничивает общий
+    планировщик исходящих запросов бота, куда воркеры приходят с приоритетом
+    рассылки.
+
+    Получатели, попавшие под flood control, откладываются в очередь
+    повторов на retry_after секунд, не более max_retries раз.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = NEWSLETTER_CONCURRENCY,
+        max_retries: int = NEWSLETTER_MAX_RETRIES,
+    ):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def run(
+        self,
+        chat_id_chunks: AsyncIterable[list[int]],
+        send: Callable[[int], Awaitable[None]],
+        on_result: Callable[[int, Exception | None], None],
+        priority: Priority = Priority.BULK,
+    ):
+        queue: asyncio.Queue[tuple[int, int]] = asyncio.Queue()
+        slots = asyncio.Semaphore(self.concurrency * 2)
+        workers = [
+            asyncio.create_task(self._worker(queue, slots, send, on_result, priority))
+            for _ in range(self.concurrency)
+        ]
+        try:
+            async for chunk in chat_id_chunks:
+                for chat_id in chunk:
+                    await slots.acquire()
+                    queue.put_nowait((chat_id, 0))
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def _schedule_retry(
+        self, queue: asyncio.Queue[tuple[int, int]], item: tuple[int, int], delay: float
+    ):
+        def requeue():
+            # Повтор кладется в очередь до task_done исходной попытки,
+            # чтобы queue.join() не завершился, пока получатель ждет повтора
+            queue.put_nowait(item)
+            queue.task_done()
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _worker(
+        self,
+        queue: asyncio.Queue[tuple[int, int]],
+        slots: asyncio.Semaphore,
+        send: Callable[[int], Awaitable[None]],
+        on_result: Callable[[int, Exception | None], None],
+        priority: Priority,
+    ):
+        with outbound_priority(priority):
+            while True:
+                chat_id, attempt = await queue.get()
+                retry_scheduled = False
+                try:
+                    error = None
+                    try:
+                        await send(chat_id)
+                    except TelegramRetryAfter as e:
+                        if attempt < self.max_retries:
+                            logger.warning(
+                                f"Flood control при отправке {chat_id}, "
+                                f"повтор через {e.retry_after} с"
+                            )
+                            self._schedule_retry(
+                                queue, (chat_id, attempt + 1), e.retry_after
+                            )
+                            retry_scheduled = True
+                            continue
+                        error = e
+                    except Exception as e:
+                        error = e
+                    on_result(chat_id, error)
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика доставки для {chat_id}: {e}")
+                finally:
+                    if not retry_scheduled:
+                        slots.release()
+                        queue.task_done()
@@ -0,0 +1,70 @@
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+ERROR_CLASSES = (
+    "blocked",
+    "chat_not_found",
+    "bad_request",
+    "retry_exhausted",
+    "unexpected",
+)
+ERROR_LABELS = {
+    "blocked": "заблокировали бота",
+    "chat_not_found": "чат не найден",
+    "bad_request": "ошибка запроса",
+    "retry_exhausted": "исчерпаны повторы (flood control)",
+    "unexpected": "прочие ошибки",
+}
+SAMPLES_PER_CLASS = 5
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, TelegramForbiddenError):
+        return "blocked"
+    if isinstance(error, TelegramBadRequest):
+        if "chat not found" in error.message.lower():
+            return "chat_not_found"
+        return "bad_request"
+    if isinstance(error, TelegramRetryAfter):
+        return "retry_exhausted"
+    return "unexpected"
+
+
+class DeliveryStats:
+    """Счетчики доставки фиксированного размера: по классам ошибок и не более
+    SAMPLES_PER_CLASS примеров на класс"""
+
+    def __init__(self, total: int = 0, success: int = 0):
+        self.total = total
+        self.success = success
+        self.errors = dict.fromkeys(ERROR_CLASSES, 0)
+        self.samples: dict[str, list[str]] = {cls: [] for cls in ERROR_CLASSES}
+
+    @property
+    def failed(self) -> int:
+        return sum(self.errors.values())
+
+    def record(self, chat_id: int, error: Exception | None) -> str | None:
+        if error is None:
+            self.success += 1
+            return None
+        error_class = classify_error(error)
+        self.errors[error_class] += 1
+        samples = self.samples[error_class]
+        if len(samples) < SAMPLES_PER_CLASS:
+            samples.append(f"User {chat_id}: {error}")
+        return error_class
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "success": self.success,
+            "failed": self.failed,
+            "errors": dict(self.errors),
+            "samples": {
+                cls: list(items) for cls, items in self.samples.items() if items
+            },
+        }
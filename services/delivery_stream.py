@@ -0,0 +1,91 @@
+from decouple import config
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DELIVERY_STREAM_KEY = config("NEWSLETTER_STREAM_KEY", default="newsletter:deliveries")
+DELIVERY_STREAM_GROUP = config("NEWSLETTER_STREAM_GROUP", default="newsletter-senders")
+DELIVERY_LEASE_SECONDS = config("NEWSLETTER_DELIVERY_LEASE", default=600, cast=int)
+
+
+class DeliveryStream:
+    """Очередь пачек доставки в Redis Stream с группой потребителей.
+
+    Запись содержит newsletter_id и id строк newsletter_deliveries. Пока
+    воркер отправляет пачку, он продлевает аренду записи; записи упавшего
+    воркера забираются другими через XAUTOCLAIM по истечении аренды
+    DELIVERY_LEASE_SECONDS.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        key: str = DELIVERY_STREAM_KEY,
+        group: str = DELIVERY_STREAM_GROUP,
+    ):
+        self.redis = redis
+        self.key = key
+        self.group = group
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.key, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def publish(self, newsletter_id: int, delivery_ids: list[int]) -> str:
+        return await self.redis.xadd(
+            self.key,
+            {
+                "newsletter_id": newsletter_id,
+                "delivery_ids": ",".join(map(str, delivery_ids)),
+            },
+        )
+
+    async def read(
+        self, consumer: str, block_ms: int = 5000
+    ) -> list[tuple[str, dict[str, str]]]:
+        response = await self.redis.xreadgroup(
+            self.group, consumer, {self.key: ">"}, count=1, block=block_ms
+        )
+        if not response:
+            return []
+        return response[0][1]
+
+    async def reclaim(self, consumer: str) -> list[tuple[str, dict[str, str]]]:
+        response = await self.redis.xautoclaim(
+            self.key,
+            self.group,
+            consumer,
+            min_idle_time=DELIVERY_LEASE_SECONDS * 1000,
+            start_id="0-0",
+            count=1,
+        )
+        return [entry for entry in response[1] if entry[1]]
+
+    async def touch(self, consumer: str, entry_id: str):
+        """Сбрасывает время простоя записи, чтобы XAUTOCLAIM не отдал ее
+        другому воркеру, пока пачка еще отправляется"""
+        await self.redis.xclaim(
+            self.key,
+            self.group,
+            consumer,
+            min_idle_time=0,
+            message_ids=[entry_id],
+            justid=True,
+        )
+
+    async def ack(self, entry_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.key, self.group, entry_id)
+            pipe.xdel(self.key, entry_id)
+            await pipe.execute()
+
+    @staticmethod
+    def parse(fields: dict[str, str]) -> tuple[int, list[int]]:
+        delivery_ids = [int(item) for item in fields["delivery_ids"].split(",") if item]
+        return int(fields["newsletter_id"]), delivery_ids
@@ -1,184 +1,693 @@
 import asyncio
 import datetime
+import os
+import socket
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from functools import partial
 
 from aiogram import Bot
-from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import (
+    SendAnimation,
+    SendDocument,
+    SendMessage,
+    SendPhoto,
+    SendVideo,
+)
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from sqlalchemy import func, select
+from decouple import config
+from sqlalchemy import Integer, Row, and_, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from models.database import AsyncSessionLocal
 from models.models import (
     ContentTypeEnum,
+    DeliveryStatusEnum,
     Newsletter,
+    NewsletterDelivery,
+    NewsletterStats,
     NewsletterStatusEnum,
     Role,
     TargetAudienceEnum,
     User,
 )
+from services.delivery import DeliveryEngine
+from services.delivery_stats import ERROR_LABELS, DeliveryStats
+from services.delivery_stream import DELIVERY_LEASE_SECONDS, DeliveryStream
+from services.outbound import Priority
+from services.payload import NewsletterPayload
+from services.progress import DeliveryProgress
 from utils.logger import get_logger
+from utils.redis import get_redis
 
 logger = get_logger(__name__)
+
+DELIVERY_BATCH_SIZE = config("NEWSLETTER_DELIVERY_BATCH_SIZE", default=1000, cast=int)
+DELIVERY_BACKEND = config("NEWSLETTER_DELIVERY_BACKEND", default="local")
+STREAM_POLL_INTERVAL = config("NEWSLETTER_STREAM_POLL_INTERVAL", default=5, cast=int)
+URGENT_AUDIENCE_SIZE = config("NEWSLETTER_URGENT_AUDIENCE_SIZE", default=100, cast=int)
+SCHEDULER_DEBUG = config("NEWSLETTER_SCHEDULER_DEBUG", default=False, cast=bool)
+CLAIM_LEASE_SECONDS = config("NEWSLETTER_CLAIM_LEASE", default=120, cast=int)
+REPLICA_ID = f"{socket.gethostname()}-{os.getpid()}"
+MAX_PARALLEL_NEWSLETTERS = config("NEWSLETTER_MAX_PARALLEL", default=4, cast=int)
+PAYLOAD_CACHE_SIZE = 32
+AUDIENCE_ROLES = {
+    TargetAudienceEnum.USERS: "user",
+    TargetAudienceEnum.MODERATORS: "moderator",
+    TargetAudienceEnum.ADMINS: "admin",
+}
+MEDIA_METHODS = {
+    ContentTypeEnum.PHOTO: (SendPhoto, "photo", "🖼️ [Фото недоступно]"),
+    ContentTypeEnum.VIDEO: (SendVideo, "video", "🎬 [Видео недоступно]"),
+    ContentTypeEnum.ANIMATION: (SendAnimation, "animation", "🎭 [GIF недоступен]"),
+    ContentTypeEnum.DOCUMENT: (SendDocument, "document", "📎 [Документ недоступен]"),
+}
+class LeaseLostError(RuntimeError):
+    """Аренда перехвачена другим исполнителем или не продлевалась дольше срока"""
 class NewsletterService:
     def __init__(self, bot: Bot):
         self.bot = bot
+        self.delivery_engine = DeliveryEngine()
+        self._payload_cache: dict[int, NewsletterPayload] = {}
+        self.progress = DeliveryProgress()
+        self.session_factory = AsyncSessionLocal
+        self.delivery_backend = DELIVERY_BACKEND
+        self.max_parallel = MAX_PARALLEL_NEWSLETTERS
+        self.on_newsletter_done: Callable[[], None] | None = None
+        self._running: dict[int, asyncio.Task] = {}
     async def send_newsletter(
         self, session: AsyncSession, newsletter_id: int
     ) -> dict[str, int]:
-        result = await session.execute(
-            select(Newsletter)
-            .options(
-                selectinload(Newsletter.creator),
-                selectinload(Newsletter.media_files),
-                selectinload(Newsletter.inline_buttons),
-            )
-            .where(Newsletter.id == newsletter_id)
+        async def renew() -> bool:
+            async with self.session_factory() as renew_session:
+                result = await renew_session.execute(
+                    update(Newsletter)
+                    .where(
+                        Newsletter.id == newsletter_id,
+                        Newsletter.claimed_by == REPLICA_ID,
+                    )
+                    .values(claimed_at=datetime.datetime.now())
+                )
+                await renew_session.commit()
+            return bool(result.rowcount)
+
+        return await self._run_under_lease(
+            self._send_claimed_newsletter(session, newsletter_id),
+            renew,
+            CLAIM_LEASE_SECONDS,
+            f"рассылки {newsletter_id}",
         )
-        newsletter = result.scalar_one_or_none()
+    async def _send_claimed_newsletter(
+        self, session: AsyncSession, newsletter_id: int
+    ) -> dict[str, int]:
+        newsletter = await self._load_newsletter(session, newsletter_id)
         if not newsletter:
             raise ValueError(f"Рассылка с ID {newsletter_id} не найдена")
-        if newsletter.status != NewsletterStatusEnum.PENDING:
+        if newsletter.status == NewsletterStatusEnum.SENDING:
+            logger.info(f"Возобновляем отправку рассылки {newsletter_id}")
+        elif newsletter.status == NewsletterStatusEnum.PENDING:
+            logger.info(f"Начинаем отправку рассылки {newsletter_id}")
+        else:
             raise ValueError(f"Рассылка уже обработана. Статус: {newsletter.status}")
+        if newsletter.claimed_by not in (None, REPLICA_ID):
+            raise LeaseLostError(
+                f"Рассылку {newsletter_id} отправляет {newsletter.claimed_by}"
+            )
         newsletter.status = NewsletterStatusEnum.SENDING
+        newsletter.claimed_at = datetime.datetime.now()
+        newsletter.claimed_by = REPLICA_ID
+        await self._materialize_deliveries(session, newsletter)
         await session.commit()
-        logger.info(f"Начинаем отправку рассылки {newsletter_id}")
-        target_users = await self._get_target_users(session, newsletter.target_audience)
-        if not target_users:
+        stats = await self._load_delivery_stats(session, newsletter_id)
+        if not stats.total:
             logger.warning(f"Не найдено пользователей для рассылки {newsletter_id}")
+            await self._save_delivery_stats(session, newsletter_id, stats)
             newsletter.status = NewsletterStatusEnum.SENT
             await session.commit()
-            return {"total": 0, "success": 0, "failed": 0}
-        stats = {"total": len(target_users), "success": 0, "failed": 0, "errors": []}
-        for user in target_users:
-            try:
-                await self._send_message_to_user(user.telegram_id, newsletter)
-                stats["success"] += 1
-                logger.debug(f"Сообщение отправлено пользователю {user.telegram_id}")
-                await asyncio.sleep(0.05)
-            except TelegramForbiddenError:
-                stats["failed"] += 1
-                stats["errors"].append(f"User {user.telegram_id}: bot blocked")
-                logger.warning(f"Пользователь {user.telegram_id} заблокировал бота")
-            except TelegramBadRequest as e:
-                stats["failed"] += 1
-                stats["errors"].append(f"User {user.telegram_id}: {str(e)}")
-                logger.error(f"Ошибка отправки пользователю {user.telegram_id}: {e}")
-            except Exception as e:
-                stats["failed"] += 1
-                stats["errors"].append(
-                    f"User {user.telegram_id}: unexpected error - {str(e)}"
-                )
-                logger.error(
-                    f"Неожиданная ошибка при отправке пользователю {user.telegram_id}: {e}"
-                )
+            return stats.as_dict()
+        await self._start_progress(newsletter_id, stats)
+        if self.delivery_backend == "redis_stream":
+            await self._dispatch_to_stream(session, newsletter_id)
+            stats = await self._wait_for_stream_delivery(session, newsletter_id)
+        else:
+            payload = self._compile_payload(newsletter)
+
+            async def pending_chat_ids(results):
+                async for rows in self._iter_pending_deliveries(
+                    session, newsletter_id, results
+                ):
+                    yield [row.chat_id for row in rows]
+
+            # Небольшие рассылки не ждут за массовыми
+            priority = (
+                Priority.URGENT
+                if stats.total <= URGENT_AUDIENCE_SIZE
+                else Priority.BULK
+            )
+            await self._deliver(
+                session, newsletter_id, payload, stats, pending_chat_ids, priority
+            )
+        await self._save_delivery_stats(session, newsletter_id, stats)
         newsletter.status = NewsletterStatusEnum.SENT
         await session.commit()
+        await self._finish_progress(newsletter_id)
         logger.info(
             f"Рассылка {newsletter_id} завершена. "
-            f"Успешно: {stats['success']}, Ошибок: {stats['failed']}"
+            f"Успешно: {stats.success}, Ошибок: {stats.failed}"
+        )
+        return stats.as_dict()
+    async def deliver_batch(
+        self,
+        session: AsyncSession,
+        newsletter_id: int,
+        delivery_ids: list[int],
+        on_renew: Callable[[], Awaitable[None]] | None = None,
+    ) -> DeliveryStats:
+        """Отправляет пачку из очереди доставки (используется воркерами).
+        Пока пачка отправляется, аренда ее строк продлевается, а on_renew
+        продлевает аренду записи в очереди"""
+        claimed_at = datetime.datetime.now()
+        chat_ids = await self._claim_deliveries(session, delivery_ids, claimed_at)
+        stats = DeliveryStats(total=len(chat_ids))
+        if not chat_ids:
+            return stats
+        payload = await self._get_payload(session, newsletter_id)
+
+        async def claimed_chat_ids(results):
+            yield chat_ids
+
+        async def renew() -> bool:
+            nonlocal claimed_at
+            renewed_at = datetime.datetime.now()
+            async with self.session_factory() as renew_session:
+                # Продлеваются только строки, арендованные этим вызовом
+                result = await renew_session.execute(
+                    update(NewsletterDelivery)
+                    .where(
+                        NewsletterDelivery.id.in_(delivery_ids),
+                        NewsletterDelivery.claimed_at == claimed_at,
+                    )
+                    .values(claimed_at=renewed_at)
+                    .execution_options(synchronize_session=False)
+                )
+                await renew_session.commit()
+            if not result.rowcount:
+                return False
+            claimed_at = renewed_at
+            if on_renew:
+                await on_renew()
+            return True
+
+        await self._run_under_lease(
+            self._deliver(session, newsletter_id, payload, stats, claimed_chat_ids),
+            renew,
+            DELIVERY_LEASE_SECONDS,
+            f"пачки рассылки {newsletter_id}",
         )
         return stats
+    async def count_pending_deliveries(
+        self, session: AsyncSession, delivery_ids: list[int]
+    ) -> int:
+        result = await session.execute(
+            select(func.count(NewsletterDelivery.id)).where(
+                NewsletterDelivery.id.in_(delivery_ids),
+                NewsletterDelivery.status == DeliveryStatusEnum.PENDING,
+            )
+        )
+        return result.scalar()
+    async def _run_under_lease(
+        self,
+        coro: Awaitable,
+        renew: Callable[[], Awaitable[bool]],
+        lease_seconds: float,
+        name: str,
+    ):
+        """Выполняет coro, продлевая аренду каждые lease_seconds / 3. Если
+        renew сообщил, что аренду перехватили, или продлить ее не удается
+        дольше срока аренды, coro отменяется: работу уже подхватил другой
+        исполнитель, и продолжение означало бы повторную отправку"""
+        work = asyncio.ensure_future(coro)
+        renewed_at = time.monotonic()
+        try:
+            while True:
+                done, _ = await asyncio.wait({work}, timeout=lease_seconds / 3)
+                if done:
+                    return work.result()
+                try:
+                    if not await renew():
+                        raise LeaseLostError(f"Аренду {name} забрал другой исполнитель")
+                    renewed_at = time.monotonic()
+                except LeaseLostError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Не удалось продлить аренду {name}: {e}")
+                    if time.monotonic() - renewed_at >= lease_seconds:
+                        raise LeaseLostError(f"Аренда {name} истекла") from e
+        finally:
+            if not work.done():
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+    async def _deliver(
+        self,
+        session: AsyncSession,
+        newsletter_id: int,
+        payload: NewsletterPayload,
+        stats: DeliveryStats,
+        chat_id_chunks: Callable[[list], AsyncIterator[list[int]]],
+        priority: Priority = Priority.BULK,
+    ):
+        results: list[tuple[int, str | None]] = []
+
+        async def send(chat_id: int):
+            await self._send_message_to_user(chat_id, payload)
+
+        def on_result(chat_id: int, error: Exception | None):
+            results.append((chat_id, self._record_result(stats, chat_id, error)))
+
+        async with self.progress.track(newsletter_id, stats):
+            await self.delivery_engine.run(
+                chat_id_chunks(results), send, on_result, priority
+            )
+        await self._flush_delivery_results(session, newsletter_id, results)
+    async def _start_progress(self, newsletter_id: int, stats: DeliveryStats):
+        try:
+            await self.progress.start(newsletter_id, stats)
+        except Exception as e:
+            logger.warning(
+                f"Не удалось начать учет прогресса рассылки {newsletter_id}: {e}"
+            )
+    async def _finish_progress(self, newsletter_id: int):
+        try:
+            await self.progress.finish(newsletter_id)
+        except Exception as e:
+            logger.warning(
+                f"Не удалось очистить прогресс рассылки {newsletter_id}: {e}"
+            )
+    async def _load_newsletter(
+        self, session: AsyncSession, newsletter_id: int
+    ) -> Newsletter | None:
+        result = await session.execute(
+            select(Newsletter)
+            .options(
+                selectinload(Newsletter.creator),
+                selectinload(Newsletter.media_files),
+                selectinload(Newsletter.inline_buttons),
+            )
+            .where(Newsletter.id == newsletter_id)
+        )
+        return result.scalar_one_or_none()
+    async def _get_payload(
+        self, session: AsyncSession, newsletter_id: int
+    ) -> NewsletterPayload:
+        payload = self._payload_cache.get(newsletter_id)
+        if payload is None:
+            newsletter = await self._load_newsletter(session, newsletter_id)
+            if not newsletter:
+                raise ValueError(f"Рассылка с ID {newsletter_id} не найдена")
+            payload = self._compile_payload(newsletter)
+            if len(self._payload_cache) >= PAYLOAD_CACHE_SIZE:
+                self._payload_cache.pop(next(iter(self._payload_cache)))
+            self._payload_cache[newsletter_id] = payload
+        return payload
+    async def _claim_deliveries(
+        self,
+        session: AsyncSession,
+        delivery_ids: list[int],
+        claimed_at: datetime.datetime,
+    ) -> list[int]:
+        """Берет строки в аренду; занятые живым воркером и уже
+        обработанные строки пропускаются, что исключает двойную отправку"""
+        lease_expired = claimed_at - datetime.timedelta(seconds=DELIVERY_LEASE_SECONDS)
+        result = await session.execute(
+            update(NewsletterDelivery)
+            .where(
+                NewsletterDelivery.id.in_(delivery_ids),
+                NewsletterDelivery.status == DeliveryStatusEnum.PENDING,
+                or_(
+                    NewsletterDelivery.claimed_at.is_(None),
+                    NewsletterDelivery.claimed_at < lease_expired,
+                ),
+            )
+            .values(claimed_at=claimed_at)
+            .returning(NewsletterDelivery.chat_id)
+            .execution_options(synchronize_session=False)
+        )
+        chat_ids = list(result.scalars().all())
+        await session.commit()
+        return chat_ids
+    async def _dispatch_to_stream(self, session: AsyncSession, newsletter_id: int):
+        stream = DeliveryStream(get_redis())
+        await stream.ensure_group()
+        batches = 0
+        async for rows in self._iter_pending_deliveries(session, newsletter_id, []):
+            await stream.publish(newsletter_id, [row.id for row in rows])
+            batches += 1
+        logger.info(
+            f"Рассылка {newsletter_id}: {batches} пачек передано воркерам отправки"
+        )
+    async def _wait_for_stream_delivery(
+        self, session: AsyncSession, newsletter_id: int
+    ) -> DeliveryStats:
+        while True:
+            result = await session.execute(
+                select(NewsletterDelivery.id)
+                .where(
+                    NewsletterDelivery.newsletter_id == newsletter_id,
+                    NewsletterDelivery.status == DeliveryStatusEnum.PENDING,
+                )
+                .limit(1)
+            )
+            if not result.first():
+                return await self._load_delivery_stats(session, newsletter_id)
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+    def _record_result(
+        self, stats: DeliveryStats, chat_id: int, error: Exception | None
+    ) -> str | None:
+        error_class = stats.record(chat_id, error)
+        if error_class is None:
+            logger.debug(f"Сообщение отправлено пользователю {chat_id}")
+        elif error_class == "blocked":
+            logger.warning(f"Пользователь {chat_id} заблокировал бота")
+        elif error_class in ("chat_not_found", "bad_request"):
+            logger.error(f"Ошибка отправки пользователю {chat_id}: {error}")
+        elif error_class == "retry_exhausted":
+            logger.error(
+                f"Исчерпаны повторы после flood control для пользователя {chat_id}"
+            )
+        else:
+            logger.error(
+                f"Неожиданная ошибка при отправке пользователю {chat_id}: {error}"
+            )
+        return error_class
     async def _get_target_users(
-        self, session: AsyncSession, target_audience: TargetAudienceEnum
+        self,
+        session: AsyncSession,
+        target_audience: TargetAudienceEnum,
+        include_unreachable: bool = False,
     ) -> list[User]:
-        if target_audience == TargetAudienceEnum.ALL:
-            result = await session.execute(
-                select(User).options(selectinload(User.role))
+        result = await session.execute(
+            self._target_users_query(
+                [User], target_audience, include_unreachable
+            ).options(selectinload(User.role))
+        )
+        return result.scalars().all()
+    def _target_users_query(
+        self,
+        columns,
+        target_audience: TargetAudienceEnum,
+        include_unreachable: bool = False,
+    ):
+        query = select(*columns)
+        role_name = AUDIENCE_ROLES.get(target_audience)
+        if role_name:
+            query = query.join(Role, User.role_id == Role.id).where(
+                Role.name == role_name
             )
-            return result.scalars().all()
-        elif target_audience == TargetAudienceEnum.USERS:
-            result = await session.execute(
-                select(User)
-                .join(Role)
-                .where(Role.name == "user")
-                .options(selectinload(User.role))
+        if not include_unreachable:
+            query = query.where(User.is_reachable)
+        return query
+    async def _materialize_deliveries(
+        self, session: AsyncSession, newsletter: Newsletter
+    ):
+        """Создает очередь доставки один раз; при возобновлении она уже есть"""
+        existing = await session.execute(
+            select(NewsletterDelivery.id)
+            .where(NewsletterDelivery.newsletter_id == newsletter.id)
+            .limit(1)
+        )
+        if existing.first():
+            return
+        await session.execute(
+            insert(NewsletterDelivery)
+            .from_select(
+                ["newsletter_id", "chat_id"],
+                self._target_users_query(
+                    [literal(newsletter.id, Integer), User.telegram_id],
+                    newsletter.target_audience,
+                ),
             )
-            return result.scalars().all()
-        elif target_audience == TargetAudienceEnum.MODERATORS:
-            result = await session.execute(
-                select(User)
-                .join(Role)
-                .where(Role.name == "moderator")
-                .options(selectinload(User.role))
+            .on_conflict_do_nothing()
+        )
+    async def _load_delivery_stats(
+        self, session: AsyncSession, newsletter_id: int
+    ) -> DeliveryStats:
+        """Восстанавливает счетчики по уже обработанным получателям"""
+        result = await session.execute(
+            select(
+                NewsletterDelivery.status,
+                NewsletterDelivery.error,
+                func.count(NewsletterDelivery.id),
             )
-            return result.scalars().all()
-        elif target_audience == TargetAudienceEnum.ADMINS:
+            .where(NewsletterDelivery.newsletter_id == newsletter_id)
+            .group_by(NewsletterDelivery.status, NewsletterDelivery.error)
+        )
+        stats = DeliveryStats()
+        for status, error_class, count in result.all():
+            stats.total += count
+            if status == DeliveryStatusEnum.SENT:
+                stats.success += count
+            elif status == DeliveryStatusEnum.FAILED:
+                if error_class not in stats.errors:
+                    error_class = "unexpected"
+                stats.errors[error_class] += count
+        return stats
+    async def _save_delivery_stats(
+        self, session: AsyncSession, newsletter_id: int, stats: DeliveryStats
+    ):
+        values = {
+            "total": stats.total,
+            "success": stats.success,
+            "failed": stats.failed,
+            **stats.errors,
+            "error_samples": stats.as_dict()["samples"],
+            "finished_at": datetime.datetime.now(),
+        }
+        await session.execute(
+            insert(NewsletterStats)
+            .values(newsletter_id=newsletter_id, **values)
+            .on_conflict_do_update(index_elements=["newsletter_id"], set_=values)
+        )
+    async def _iter_pending_deliveries(
+        self,
+        session: AsyncSession,
+        newsletter_id: int,
+        results: list[tuple[int, str | None]],
+        batch_size: int = DELIVERY_BATCH_SIZE,
+    ) -> AsyncIterator[list[Row]]:
+        """Забирает PENDING-получателей пачками (keyset по id), сохраняя
+        накопленные результаты перед каждой следующей пачкой"""
+        last_id = 0
+        while True:
+            await self._flush_delivery_results(session, newsletter_id, results)
             result = await session.execute(
-                select(User)
-                .join(Role)
-                .where(Role.name == "admin")
-                .options(selectinload(User.role))
+                select(NewsletterDelivery.id, NewsletterDelivery.chat_id)
+                .where(
+                    NewsletterDelivery.newsletter_id == newsletter_id,
+                    NewsletterDelivery.status == DeliveryStatusEnum.PENDING,
+                    NewsletterDelivery.id > last_id,
+                )
+                .order_by(NewsletterDelivery.id)
+                .limit(batch_size)
             )
-            return result.scalars().all()
-        return []
-    async def process_pending_newsletters(self):
-        async with AsyncSessionLocal() as session:
-            try:
-                now = datetime.datetime.now()
-                print("DEBUG: Планировщик проверяет рассылки")
-                print(f"DEBUG: Текущее время сервера: {now}")
-                print(f"DEBUG: Временная зона сервера: {now.astimezone().tzinfo}")
-                all_scheduled_result = await session.execute(
-                    select(Newsletter).where(
-                        Newsletter.status == NewsletterStatusEnum.SCHEDULED
-                    )
+            rows = result.all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield rows
+    async def _flush_delivery_results(
+        self,
+        session: AsyncSession,
+        newsletter_id: int,
+        results: list[tuple[int, str | None]],
+    ):
+        if not results:
+            return
+        batch = results[:]
+        results.clear()
+        now = datetime.datetime.now()
+        by_status: dict[str | None, list[int]] = {}
+        for chat_id, error_class in batch:
+            by_status.setdefault(error_class, []).append(chat_id)
+        for error_class, chat_ids in by_status.items():
+            status = (
+                DeliveryStatusEnum.SENT
+                if error_class is None
+                else DeliveryStatusEnum.FAILED
+            )
+            await session.execute(
+                update(NewsletterDelivery)
+                .where(
+                    NewsletterDelivery.newsletter_id == newsletter_id,
+                    NewsletterDelivery.chat_id.in_(chat_ids),
                 )
-                all_scheduled = all_scheduled_result.scalars().all()
-                print(
-                    f"DEBUG: Всего запланированных рассылок в базе: {len(all_scheduled)}"
+                .values(status=status, error=error_class, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        if by_status.get("blocked"):
+            await session.execute(
+                update(User)
+                .where(User.telegram_id.in_(by_status["blocked"]), User.is_reachable)
+                .values(is_reachable=False, blocked_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+    def _lease_expired(self, now: datetime.datetime):
+        return or_(
+            Newsletter.claimed_at.is_(None),
+            Newsletter.claimed_at
+            < now - datetime.timedelta(seconds=CLAIM_LEASE_SECONDS),
+        )
+    async def claim_due_newsletters(
+        self, session: AsyncSession, limit: int
+    ) -> list[Newsletter]:
+        """Берет в аренду наступившие рассылки и рассылки с истекшей арендой
+        (реплика упала посреди отправки). FOR UPDATE SKIP LOCKED не дает двум
+        репликам забрать одну и ту же рассылку"""
+        now = datetime.datetime.now()
+        claimed = []
+        for condition in (
+            and_(
+                Newsletter.status == NewsletterStatusEnum.SCHEDULED,
+                Newsletter.scheduled_at <= now,
+            ),
+            Newsletter.status.in_(
+                [NewsletterStatusEnum.PENDING, NewsletterStatusEnum.SENDING]
+            ),
+        ):
+            result = await session.execute(
+                select(Newsletter)
+                .where(condition, self._lease_expired(now))
+                .order_by(Newsletter.scheduled_at)
+                .limit(limit - len(claimed))
+                .with_for_update(skip_locked=True)
+            )
+            claimed.extend(result.scalars().all())
+            if len(claimed) >= limit:
+                break
+        for newsletter in claimed:
+            if newsletter.status == NewsletterStatusEnum.SCHEDULED:
+                newsletter.status = NewsletterStatusEnum.PENDING
+            newsletter.claimed_at = now
+            newsletter.claimed_by = REPLICA_ID
+        await session.commit()
+        return claimed
+    async def get_upcoming_schedule(
+        self, session: AsyncSession, limit: int
+    ) -> list[tuple[datetime.datetime, int]]:
+        """Ближайшие моменты, когда рассылку можно будет забрать: наступление
+        scheduled_at либо истечение чужой аренды. Пары (срок, id)"""
+        lease = datetime.timedelta(seconds=CLAIM_LEASE_SECONDS)
+        scheduled = await session.execute(
+            select(Newsletter.scheduled_at, Newsletter.claimed_at, Newsletter.id)
+            .where(
+                Newsletter.status == NewsletterStatusEnum.SCHEDULED,
+                Newsletter.scheduled_at.is_not(None),
+            )
+            .order_by(Newsletter.scheduled_at)
+            .limit(limit)
+        )
+        in_progress = await session.execute(
+            select(Newsletter.scheduled_at, Newsletter.claimed_at, Newsletter.id)
+            .where(
+                Newsletter.status.in_(
+                    [NewsletterStatusEnum.PENDING, NewsletterStatusEnum.SENDING]
                 )
-                for newsletter in all_scheduled:
-                    print(
-                        f"DEBUG: Рассылка ID={newsletter.id}, время={newsletter.scheduled_at}, статус={newsletter.status}"
-                    )
-                    print(f"DEBUG: Время наступило? {newsletter.scheduled_at <= now}")
-                result = await session.execute(
-                    select(Newsletter)
-                    .options(selectinload(Newsletter.creator))
-                    .where(
-                        Newsletter.status == NewsletterStatusEnum.SCHEDULED,
-                        Newsletter.scheduled_at <= now,
-                    )
+            )
+            .order_by(Newsletter.claimed_at.nulls_first())
+            .limit(limit)
+        )
+        now = datetime.datetime.now()
+        return [
+            (
+                max(
+                    scheduled_at or now,
+                    claimed_at + lease if claimed_at else now,
+                ),
+                newsletter_id,
+            )
+            for scheduled_at, claimed_at, newsletter_id in [
+                *scheduled.all(),
+                *in_progress.all(),
+            ]
+        ]
+    @property
+    def free_slots(self) -> int:
+        return self.max_parallel - len(self._running)
+    async def process_pending_newsletters(self):
+        """Забирает столько наступивших рассылок, сколько свободно слотов, и
+        отправляет каждую отдельной задачей со своей сессией"""
+        if self.free_slots <= 0:
+            return
+        try:
+            async with self.session_factory() as session:
+                pending_newsletters = await self.claim_due_newsletters(
+                    session, self.free_slots
                 )
-                pending_newsletters = result.scalars().all()
-                print(
-                    f"DEBUG: Найдено {len(pending_newsletters)} рассылок для обработки"
+        except Exception as e:
+            logger.error(f"Ошибка при обработке pending рассылок: {e}")
+            return
+        if SCHEDULER_DEBUG:
+            logger.info(
+                f"Реплика {REPLICA_ID} забрала рассылок: {len(pending_newsletters)}"
+            )
+            for newsletter in pending_newsletters:
+                logger.info(
+                    f"Рассылка ID={newsletter.id}, "
+                    f"время={newsletter.scheduled_at}, "
+                    f"статус={newsletter.status}"
                 )
-                for newsletter in pending_newsletters:
-                    print(
-                        f"DEBUG: Рассылка ID={newsletter.id}, время={newsletter.scheduled_at}, статус={newsletter.status}"
-                    )
-                for newsletter in pending_newsletters:
-                    try:
-                        newsletter.status = NewsletterStatusEnum.PENDING
-                        await session.commit()
-                        stats = await self.send_newsletter(session, newsletter.id)
-                        await self._notify_creator_about_results(newsletter, stats)
-                    except Exception as e:
-                        logger.error(
-                            f"Ошибка при обработке рассылки {newsletter.id}: {e}"
-                        )
-                        failed_newsletter_result = await session.execute(
-                            select(Newsletter)
-                            .options(selectinload(Newsletter.creator))
-                            .where(Newsletter.id == newsletter.id)
+        for newsletter in pending_newsletters:
+            task = asyncio.create_task(
+                self._process_newsletter(newsletter), name=f"newsletter-{newsletter.id}"
+            )
+            self._running[newsletter.id] = task
+            task.add_done_callback(partial(self._on_newsletter_done, newsletter.id))
+    def _on_newsletter_done(self, newsletter_id: int, task: asyncio.Task):
+        self._running.pop(newsletter_id, None)
+        if self.on_newsletter_done:
+            self.on_newsletter_done()
+    async def _process_newsletter(self, newsletter: Newsletter):
+        async with self.session_factory() as session:
+            try:
+                stats = await self.send_newsletter(session, newsletter.id)
+                await self._notify_creator_about_results(newsletter, stats)
+            except LeaseLostError as e:
+                logger.warning(f"Отправка рассылки {newsletter.id} прервана: {e}")
+            except Exception as e:
+                logger.error(f"Ошибка при обработке рассылки {newsletter.id}: {e}")
+                try:
+                    await session.rollback()
+                    # Свежая аренда откладывает повтор на CLAIM_LEASE_SECONDS;
+                    # рассылку, которую уже забрала другая реплика, не трогаем
+                    await session.execute(
+                        update(Newsletter)
+                        .where(
+                            Newsletter.id == newsletter.id,
+                            Newsletter.claimed_by == REPLICA_ID,
                         )
-                        failed_newsletter = (
-                            failed_newsletter_result.scalar_one_or_none()
+                        .values(
+                            status=NewsletterStatusEnum.SCHEDULED,
+                            claimed_at=datetime.datetime.now(),
                         )
-                        if failed_newsletter:
-                            failed_newsletter.status = (
-                                NewsletterStatusEnum.SCHEDULED
-                            )
-                            await session.commit()
-            except Exception as e:
-                logger.error(f"Ошибка при обработке pending рассылок: {e}")
+                    )
+                    await session.commit()
+                except Exception as e:
+                    logger.error(
+                        f"Не удалось вернуть рассылку {newsletter.id} в очередь: {e}"
+                    )
+    async def shutdown(self):
+        """Прерывает идущие отправки; их аренда истечет и они будут досланы"""
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
     async def _notify_creator_about_results(
         self, newsletter: Newsletter, stats: dict[str, int]
     ):
         try:
-            async with AsyncSessionLocal() as session:
+            async with self.session_factory() as session:
                 creator = await session.get(User, newsletter.creator_id)
                 if not creator:
                     logger.warning(f"Создатель рассылки {newsletter.id} не найден")
@@ -191,6 +700,7 @@ class NewsletterService:
                     f"• Всего пользователей: {stats['total']}\n"
                     f"• Успешно доставлено: {stats['success']}\n"
                     f"• Не доставлено: {stats['failed']}\n"
+                    f"{format_error_breakdown(stats['errors'])}"
                     f"⏰ <b>Время завершения:</b> {datetime.datetime.now().strftime('%d.%m.%Y %H:%M')}"
                 )
                 await self.bot.send_message(
@@ -201,93 +711,30 @@ class NewsletterService:
             logger.error(
                 f"Ошибка при отправке отчета создателю рассылки {newsletter.id}: {e}"
             )
-    async def _send_message_to_user(self, chat_id: int, newsletter: Newsletter):
+    def _compile_payload(self, newsletter: Newsletter) -> NewsletterPayload:
         reply_markup = self._create_inline_keyboard(newsletter)
         content_type = getattr(newsletter, "content_type", ContentTypeEnum.TEXT)
-
-        try:
-            if content_type == ContentTypeEnum.TEXT:
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=newsletter.text,
-                    parse_mode="HTML",
-                    reply_markup=reply_markup,
-                )
-            elif content_type == ContentTypeEnum.PHOTO:
-                media_file = self._get_media_file(newsletter, "photo")
-                if media_file:
-                    await self.bot.send_photo(
-                        chat_id=chat_id,
-                        photo=media_file.file_id,
-                        caption=newsletter.text,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-                else:
-                    await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=f"🖼️ [Фото недоступно]\n\n{newsletter.text}",
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-            elif content_type == ContentTypeEnum.VIDEO:
-                media_file = self._get_media_file(newsletter, "video")
-                if media_file:
-                    await self.bot.send_video(
-                        chat_id=chat_id,
-                        video=media_file.file_id,
-                        caption=newsletter.text,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-                else:
-                    await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=f"🎬 [Видео недоступно]\n\n{newsletter.text}",
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-            elif content_type == ContentTypeEnum.ANIMATION:
-                media_file = self._get_media_file(newsletter, "animation")
-                if media_file:
-                    await self.bot.send_animation(
-                        chat_id=chat_id,
-                        animation=media_file.file_id,
-                        caption=newsletter.text,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-                else:
-                    await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=f"🎭 [GIF недоступен]\n\n{newsletter.text}",
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-            elif content_type == ContentTypeEnum.DOCUMENT:
-                media_file = self._get_media_file(newsletter, "document")
-                if media_file:
-                    await self.bot.send_document(
-                        chat_id=chat_id,
-                        document=media_file.file_id,
-                        caption=newsletter.text,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-                else:
-                    await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=f"📎 [Документ недоступен]\n\n{newsletter.text}",
-                        parse_mode="HTML",
-                        reply_markup=reply_markup,
-                    )
-            else:
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=newsletter.text,
+        text = newsletter.text
+        if content_type in MEDIA_METHODS:
+            method_class, field, placeholder = MEDIA_METHODS[content_type]
+            media_file = self._get_media_file(newsletter, content_type.value)
+            if media_file:
+                method = method_class(
+                    chat_id=0,
+                    caption=text,
                     parse_mode="HTML",
                     reply_markup=reply_markup,
+                    **{field: media_file.file_id},
                 )
+                return NewsletterPayload(newsletter.id, method)
+            text = f"{placeholder}\n\n{text}"
+        method = SendMessage(
+            chat_id=0, text=text, parse_mode="HTML", reply_markup=reply_markup
+        )
+        return NewsletterPayload(newsletter.id, method)
+    async def _send_message_to_user(self, chat_id: int, payload: NewsletterPayload):
+        try:
+            await self.bot(payload.for_chat(chat_id))
         except Exception as e:
             logger.error(f"Ошибка отправки медиа пользователю {chat_id}: {e}")
             raise
@@ -345,3 +792,9 @@ async def get_newsletter_stats(session: AsyncSession) -> dict:
         )
         stats_by_status[status.value] = result.scalar()
     return {"total": total_newsletters, "by_status": stats_by_status}
+def format_error_breakdown(errors: dict[str, int]) -> str:
+    return "".join(
+        f"   – {ERROR_LABELS[error_class]}: {count}\n"
+        for error_class, count in errors.items()
+        if count
+    )
@@ -0,0 +1,79 @@
+import enum
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from decouple import config
+
+from services.rate_limiter import RedisTokenBucket, TokenBucket
+from utils.logger import get_logger
+from utils.redis import get_redis
+
+logger = get_logger(__name__)
+
+# Лимит на весь бот: делится между процессом опроса и всеми воркерами отправки
+BOT_RATE_LIMIT = config("BOT_RATE_LIMIT", default=25, cast=float)
+# Доля ведра, которую массовая отправка оставляет более срочным запросам
+BOT_RATE_RESERVE = config("BOT_RATE_RESERVE", default=0.2, cast=float)
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0
+    URGENT = 1
+    BULK = 2
+
+
+request_priority: ContextVar[Priority] = ContextVar(
+    "request_priority", default=Priority.INTERACTIVE
+)
+rate_limiter = RedisTokenBucket(
+    get_redis(),
+    rate=BOT_RATE_LIMIT,
+    reserve_per_priority=BOT_RATE_RESERVE / Priority.BULK,
+)
+
+
+@contextmanager
+def outbound_priority(priority: Priority) -> Iterator[None]:
+    token = request_priority.set(priority)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class PriorityRequestMiddleware(BaseRequestMiddleware):
+    """Единый планировщик исходящих запросов бота.
+
+    Все методы, адресованные чату, проходят через общий для всех процессов
+    ограничитель скорости: ответы обработчиков (по умолчанию INTERACTIVE) и
+    срочные рассылки получают токены раньше массовой отправки, которой
+    достается оставшаяся пропускная способность.
+    """
+
+    def __init__(self, rate_limiter: TokenBucket = rate_limiter):
+        self.rate_limiter = rate_limiter
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        if "chat_id" not in type(method).model_fields:
+            return await make_request(bot, method)
+        await self.rate_limiter.acquire(request_priority.get())
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            logger.warning(f"Flood control: пауза исходящих запросов {e.retry_after} с")
+            await self.rate_limiter.throttle(e.retry_after)
+            raise
@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+from aiogram.methods import TelegramMethod
+
+
+@dataclass(frozen=True, slots=True)
+class NewsletterPayload:
+    """Собранный один раз запрос рассылки; на получателя меняется только chat_id"""
+
+    newsletter_id: int
+    method: TelegramMethod
+
+    def for_chat(self, chat_id: int) -> TelegramMethod:
+        return self.method.model_copy(update={"chat_id": chat_id})
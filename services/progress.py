@@ -0,0 +1,126 @@
+import asyncio
+import datetime
+import time
+from contextlib import asynccontextmanager
+
+from decouple import config
+from redis.asyncio import Redis
+
+from services.delivery_stats import DeliveryStats
+from utils.logger import get_logger
+from utils.redis import get_redis
+
+logger = get_logger(__name__)
+
+PROGRESS_FLUSH_INTERVAL = config(
+    "NEWSLETTER_PROGRESS_FLUSH_INTERVAL", default=2, cast=float
+)
+PROGRESS_TTL_SECONDS = 24 * 60 * 60
+
+
+class DeliveryProgress:
+    """Счетчики идущей рассылки в Redis, общие для бота и воркеров отправки"""
+
+    def __init__(self, redis: Redis | None = None):
+        self.redis = redis or get_redis()
+
+    @staticmethod
+    def _key(newsletter_id: int) -> str:
+        return f"newsletter:{newsletter_id}:progress"
+
+    async def start(self, newsletter_id: int, stats: DeliveryStats):
+        key = self._key(newsletter_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                key,
+                mapping={
+                    "total": stats.total,
+                    "sent": stats.success,
+                    "failed": stats.failed,
+                    "done_at_start": stats.success + stats.failed,
+                    "started_at": time.time(),
+                },
+            )
+            pipe.expire(key, PROGRESS_TTL_SECONDS)
+            await pipe.execute()
+
+    async def add(self, newsletter_id: int, sent: int, failed: int):
+        key = self._key(newsletter_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, "sent", sent)
+            pipe.hincrby(key, "failed", failed)
+            pipe.expire(key, PROGRESS_TTL_SECONDS)
+            await pipe.execute()
+
+    async def finish(self, newsletter_id: int):
+        await self.redis.delete(self._key(newsletter_id))
+
+    async def get(self, newsletter_id: int) -> dict | None:
+        raw = await self.redis.hgetall(self._key(newsletter_id))
+        if not raw or "total" not in raw:
+            return None
+        total, sent, failed = int(raw["total"]), int(raw["sent"]), int(raw["failed"])
+        done = sent + failed
+        elapsed = max(time.time() - float(raw["started_at"]), 1e-3)
+        rate = (done - int(raw["done_at_start"])) / elapsed
+        remaining = max(total - done, 0)
+        return {
+            "total": total,
+            "sent": sent,
+            "failed": failed,
+            "remaining": remaining,
+            "rate": rate,
+            "eta": remaining / rate if rate > 0 else None,
+        }
+
+    @asynccontextmanager
+    async def track(
+        self,
+        newsletter_id: int,
+        stats: DeliveryStats,
+        interval: float = PROGRESS_FLUSH_INTERVAL,
+    ):
+        """Периодически переносит приращения счетчиков stats в Redis"""
+        reported = {"sent": stats.success, "failed": stats.failed}
+
+        async def report():
+            sent = stats.success - reported["sent"]
+            failed = stats.failed - reported["failed"]
+            if not sent and not failed:
+                return
+            try:
+                await self.add(newsletter_id, sent, failed)
+                reported["sent"] += sent
+                reported["failed"] += failed
+            except Exception as e:
+                logger.warning(
+                    f"Не удалось обновить прогресс рассылки {newsletter_id}: {e}"
+                )
+
+        async def report_periodically():
+            while True:
+                await asyncio.sleep(interval)
+                await report()
+
+        task = asyncio.create_task(report_periodically())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await report()
+
+
+def format_progress(progress: dict) -> str:
+    eta = (
+        str(datetime.timedelta(seconds=int(progress["eta"])))
+        if progress["eta"] is not None
+        else "—"
+    )
+    return (
+        f"• Отправлено: ✅ {progress['sent']}\n"
+        f"• Ошибок: ❌ {progress['failed']}\n"
+        f"• Осталось: {progress['remaining']} из {progress['total']}\n"
+        f"• Скорость: {progress['rate']:.1f} сообщ./с\n"
+        f"• Осталось времени: ~{eta}\n"
+    )
@@ -0,0 +1,249 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from redis.asyncio import Redis
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RATE_LIMITER_STATE_TTL = 3600
+REDIS_RETRY_COOLDOWN = 5
+# Состояние ведра в хэше: tokens, updated_at, paused_until, throttled_rate,
+# throttled_at. Время берется из Redis, чтобы часы процессов не расходились
+_REDIS_BUCKET_STATE = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local nominal_rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local recovery = tonumber(ARGV[3])
+local state = redis.call(
+    'HMGET', KEYS[1],
+    'tokens', 'updated_at', 'paused_until', 'throttled_rate', 'throttled_at'
+)
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+local paused_until = tonumber(state[3]) or 0
+local throttled_rate = tonumber(state[4]) or nominal_rate
+local throttled_at = tonumber(state[5]) or 0
+local rate = math.min(
+    nominal_rate, throttled_rate + math.max(now - throttled_at, 0) * recovery
+)
+tokens = math.min(capacity, tokens + math.max(now - updated_at, 0) * rate)
+"""
+_REDIS_BUCKET_TAKE = (
+    _REDIS_BUCKET_STATE
+    + """
+if now < paused_until then
+    return tostring(paused_until - now)
+end
+local needed = tonumber(ARGV[4])
+local wait = 0
+if tokens >= needed then
+    tokens = tokens - 1
+else
+    wait = (needed - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return tostring(wait)
+"""
+)
+_REDIS_BUCKET_THROTTLE = (
+    _REDIS_BUCKET_STATE
+    + """
+-- Ответы 429 на запросы, ушедшие до паузы, относятся к тому же событию
+if now >= paused_until then
+    rate = math.max(tonumber(ARGV[6]), rate * tonumber(ARGV[7]))
+end
+paused_until = math.max(paused_until, now + tonumber(ARGV[4]))
+redis.call(
+    'HSET', KEYS[1],
+    'tokens', 0, 'updated_at', paused_until, 'paused_until', paused_until,
+    'throttled_rate', rate, 'throttled_at', paused_until
+)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return tostring(rate)
+"""
+)
+
+
+class TokenBucket:
+    """Глобальный ограничитель скорости отправки (сообщений в секунду).
+
+    После ответа 429 (flood control) все отправители ждут retry_after, а
+    скорость снижается и затем постепенно возвращается к номинальной.
+    Токены выдаются по приоритету (меньше — срочнее), внутри приоритета — FIFO.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int | None = None,
+        min_rate: float = 1.0,
+        decrease_factor: float = 0.8,
+        recovery_per_second: float = 0.1,
+    ):
+        self.nominal_rate = rate
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.min_rate = min_rate
+        self.decrease_factor = decrease_factor
+        self.recovery_per_second = recovery_per_second
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._throttled_rate = rate
+        self._throttled_at = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Event]] = []
+        self._sequence = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate < self.nominal_rate:
+            self.rate = min(
+                self.nominal_rate,
+                self._throttled_rate
+                + (now - self._throttled_at) * self.recovery_per_second,
+            )
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    async def throttle(self, retry_after: float):
+        now = time.monotonic()
+        # Ответы 429 на запросы, ушедшие до паузы, относятся к тому же
+        # событию: скорость снижается один раз за паузу
+        if now >= self._paused_until:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._throttled_rate = self.rate
+        self._paused_until = max(self._paused_until, now + retry_after)
+        self._tokens = 0.0
+        self._updated_at = self._paused_until
+        self._throttled_at = self._paused_until
+
+    async def _take(self, priority: int) -> float:
+        """Берет токен; возвращает 0 либо сколько секунд ждать следующей попытки"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self, priority: int = 0):
+        turn = asyncio.Event()
+        entry = (priority, next(self._sequence), turn)
+        heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                if self._waiters[0] is not entry:
+                    # Более срочный запрос занял очередь: ждем, пока он уйдет
+                    turn.clear()
+                    await turn.wait()
+                    continue
+                wait = await self._take(priority)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            if self._waiters:
+                self._waiters[0][2].set()
+
+
+class RedisTokenBucket(TokenBucket):
+    """Ограничитель скорости, общий для всех процессов бота через Redis.
+
+    Лимит Telegram действует на весь бот, поэтому процесс опроса и воркеры
+    отправки берут токены из одного ведра и вместе соблюдают паузу после
+    429. Приоритеты между процессами держит резерв: запрос с приоритетом p
+    берет токен, только если в ведре остается больше p * reserve_per_priority
+    его емкости, так что массовая отправка не выбирает ведро до дна и ответам
+    обработчиков токен достается сразу. Внутри процесса очередь по-прежнему
+    упорядочена по приоритету.
+
+    Если Redis недоступен, процесс на redis_cooldown секунд переходит на
+    локальное ведро и не обращается к Redis, затем пробует снова.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        rate: float,
+        key: str = "bot:rate_limiter",
+        reserve_per_priority: float = 0.0,
+        redis_cooldown: float = REDIS_RETRY_COOLDOWN,
+        **kwargs,
+    ):
+        super().__init__(rate, **kwargs)
+        self.redis = redis
+        self.key = key
+        self.reserve_per_priority = reserve_per_priority
+        self.redis_cooldown = redis_cooldown
+        self._redis_down = False
+        self._redis_retry_at = 0.0
+        self._take_script = redis.register_script(_REDIS_BUCKET_TAKE)
+        self._throttle_script = redis.register_script(_REDIS_BUCKET_THROTTLE)
+
+    def _args(self, *extra) -> list:
+        return [
+            self.nominal_rate,
+            self.capacity,
+            self.recovery_per_second,
+            *extra,
+            RATE_LIMITER_STATE_TTL,
+        ]
+
+    def _redis_available(self) -> bool:
+        return not self._redis_down or time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, error: Exception):
+        if not self._redis_down:
+            logger.warning(
+                f"Общий ограничитель скорости в Redis недоступен, "
+                f"используется локальный: {error}"
+            )
+        self._redis_down = True
+        self._redis_retry_at = time.monotonic() + self.redis_cooldown
+
+    def _redis_succeeded(self):
+        if self._redis_down:
+            logger.info("Общий ограничитель скорости в Redis снова доступен")
+            self._redis_down = False
+
+    async def _take(self, priority: int) -> float:
+        if not self._redis_available():
+            return await super()._take(priority)
+        needed = 1 + priority * self.reserve_per_priority * self.capacity
+        try:
+            wait = await self._take_script(keys=[self.key], args=self._args(needed))
+        except Exception as e:
+            self._redis_failed(e)
+            return await super()._take(priority)
+        self._redis_succeeded()
+        return float(wait)
+
+    async def throttle(self, retry_after: float):
+        await super().throttle(retry_after)
+        if not self._redis_available():
+            return
+        try:
+            await self._throttle_script(
+                keys=[self.key],
+                args=[
+                    *self._args(retry_after),
+                    self.min_rate,
+                    self.decrease_factor,
+                ],
+            )
+        except Exception as e:
+            self._redis_failed(e)
+            return
+        self._redis_succeeded()
@@ -0,0 +1,136 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from decouple import config
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import Role, User
+from utils.logger import get_logger
+from utils.redis import get_redis
+
+logger = get_logger(__name__)
+
+ROLE_CACHE_TTL = config("ROLE_CACHE_TTL", default=300, cast=int)
+ROLE_CACHE_LOCAL_TTL = config("ROLE_CACHE_LOCAL_TTL", default=30, cast=float)
+ROLE_CACHE_SIZE = config("ROLE_CACHE_SIZE", default=10_000, cast=int)
+INVALIDATION_CHANNEL = "role_cache:invalidate"
+NO_ROLE = ""
+LISTEN_RECONNECT_DELAY = 5
+GENERATION_TTL = 24 * 60 * 60
+# Роль из БД записывается, только если с момента чтения ее никто не сбросил
+_SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class RoleCache:
+    """Роль пользователя по telegram_id: LRU с TTL в процессе поверх Redis.
+
+    Смена роли сбрасывает запись в Redis, увеличивает поколение записи и
+    рассылает telegram_id через pub/sub, чтобы все реплики сразу забыли
+    локальную копию. Поколение не дает запросу, прочитавшему роль до смены,
+    записать ее в кэш уже после сброса.
+    """
+
+    def __init__(self, redis: Redis | None = None):
+        self.redis = redis or get_redis()
+        self._local: OrderedDict[int, tuple[float, str | None]] = OrderedDict()
+        # Растет при каждом сбросе локальных записей
+        self._epoch = 0
+        self._set_if_generation = self.redis.register_script(_SET_IF_GENERATION)
+
+    @staticmethod
+    def _key(telegram_id: int) -> str:
+        return f"user:{telegram_id}:role"
+
+    @staticmethod
+    def _generation_key(telegram_id: int) -> str:
+        return f"user:{telegram_id}:role:generation"
+
+    def _remember(self, telegram_id: int, role: str | None):
+        self._local[telegram_id] = (time.monotonic() + ROLE_CACHE_LOCAL_TTL, role)
+        self._local.move_to_end(telegram_id)
+        while len(self._local) > ROLE_CACHE_SIZE:
+            self._local.popitem(last=False)
+
+    def forget(self, telegram_id: int):
+        self._epoch += 1
+        self._local.pop(telegram_id, None)
+
+    async def get_role(self, session: AsyncSession, telegram_id: int) -> str | None:
+        cached = self._local.get(telegram_id)
+        if cached and cached[0] > time.monotonic():
+            self._local.move_to_end(telegram_id)
+            return cached[1]
+        epoch = self._epoch
+        keys = [self._key(telegram_id), self._generation_key(telegram_id)]
+        try:
+            role, generation = await self.redis.mget(keys)
+        except Exception as e:
+            logger.warning(f"Кэш ролей в Redis недоступен: {e}")
+            role, generation = None, None
+        if role is None:
+            role = await self._load_role(session, telegram_id)
+            try:
+                stored = await self._set_if_generation(
+                    keys=keys,
+                    args=[generation or "", role or NO_ROLE, ROLE_CACHE_TTL],
+                )
+                if not stored:
+                    # Роль сменилась, пока шло чтение: не кэшируем и локально
+                    epoch = None
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить роль в Redis: {e}")
+        role = role or None
+        if epoch == self._epoch:
+            self._remember(telegram_id, role)
+        return role
+
+    async def _load_role(self, session: AsyncSession, telegram_id: int) -> str | None:
+        result = await session.execute(
+            select(Role.name)
+            .join(User, User.role_id == Role.id)
+            .where(User.telegram_id == telegram_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def invalidate(self, telegram_id: int):
+        """Вызывается после коммита смены роли"""
+        self.forget(telegram_id)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(self._generation_key(telegram_id))
+                pipe.expire(self._generation_key(telegram_id), GENERATION_TTL)
+                pipe.delete(self._key(telegram_id))
+                await pipe.execute()
+            await self.redis.publish(INVALIDATION_CHANNEL, telegram_id)
+        except Exception as e:
+            logger.error(f"Не удалось сбросить кэш роли {telegram_id}: {e}")
+
+    async def listen(self):
+        """Сбрасывает локальные записи по сообщениям других реплик"""
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # Пока подписки не было, сообщения могли потеряться
+                    self._epoch += 1
+                    self._local.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.forget(int(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Потеряна подписка на {INVALIDATION_CHANNEL}: {e}")
+            await asyncio.sleep(LISTEN_RECONNECT_DELAY)
+
+
+role_cache = RoleCache()
@@ -1,59 +1,145 @@
 import asyncio
+import datetime
+import heapq
 
+import asyncpg
 from aiogram import Bot
+from decouple import config
+from sqlalchemy.engine import make_url
 
+from models.database import DATABASE_URL, AsyncSessionLocal
 from services.newsletter_service import NewsletterService
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
+
+SCHEDULER_RESYNC_INTERVAL = config(
+    "NEWSLETTER_SCHEDULER_RESYNC_INTERVAL", default=300, cast=float
+)
+SCHEDULER_HORIZON_SIZE = config(
+    "NEWSLETTER_SCHEDULER_HORIZON_SIZE", default=1000, cast=int
+)
+SCHEDULE_CHANNEL = "newsletter_schedule"
+SCHEDULER_MIN_SLEEP = 1
+LISTEN_RECONNECT_DELAY = 5
+LISTEN_PING_INTERVAL = 60
 class NewsletterScheduler:
-    def __init__(self, bot: Bot, check_interval: int = 60):
+    """Спит ровно до ближайшего срока из кучи в памяти (scheduled_at или
+    истечение аренды), затем забирает рассылки и сверяет сроки с базой.
+    Сверка также идет раз в resync_interval и по wake(), в том числе
+    по NOTIFY из триггера на newsletters"""
+    def __init__(self, bot: Bot, resync_interval: float = SCHEDULER_RESYNC_INTERVAL):
         self.bot = bot
-        self.check_interval = check_interval
+        self.resync_interval = resync_interval
         self.newsletter_service = NewsletterService(bot)
+        self.newsletter_service.on_newsletter_done = self.wake
         self.running = False
         self._task = None
+        self._listen_task = None
+        self._deadlines: list[tuple[datetime.datetime, int]] = []
+        self._wakeup = asyncio.Event()
     async def start(self):
         if self.running:
             logger.warning("Планировщик уже запущен")
             return
         self.running = True
         self._task = asyncio.create_task(self._run_scheduler())
+        self._listen_task = asyncio.create_task(self._listen_for_changes())
         logger.info(
-            f"Планировщик рассылок запущен с интервалом {self.check_interval} секунд"
+            "Планировщик рассылок запущен, сверка с базой раз в "
+            f"{self.resync_interval} секунд"
         )
     async def stop(self):
         if not self.running:
             return
         self.running = False
-        if self._task:
-            self._task.cancel()
+        for task in (self._task, self._listen_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        await self.newsletter_service.shutdown()
+        logger.info("Планировщик рассылок остановлен")
+    def wake(self):
+        """Просит пересобрать расписание из базы, не дожидаясь сверки"""
+        self._wakeup.set()
+    def _on_schedule_notify(self, connection, pid, channel, payload):
+        logger.debug(f"Изменено расписание рассылки {payload}")
+        self.wake()
+    async def _listen_for_changes(self):
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql")
+        while self.running:
             try:
-                await self._task
+                await self._listen(dsn.render_as_string(hide_password=False))
             except asyncio.CancelledError:
-                pass
-        logger.info("Планировщик рассылок остановлен")
+                raise
+            except Exception as e:
+                logger.warning(f"Потеряна подписка на {SCHEDULE_CHANNEL}: {e}")
+            await asyncio.sleep(LISTEN_RECONNECT_DELAY)
+    async def _listen(self, dsn: str):
+        connection = await asyncpg.connect(dsn)
+        try:
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+            await connection.add_listener(SCHEDULE_CHANNEL, self._on_schedule_notify)
+            logger.info(f"Подписка на канал {SCHEDULE_CHANNEL} установлена")
+            # Уведомления, пропущенные без подписки, покрывает внеочередная сверка
+            self.wake()
+            while not closed.is_set():
+                try:
+                    await asyncio.wait_for(closed.wait(), LISTEN_PING_INTERVAL)
+                except TimeoutError:
+                    await connection.execute("SELECT 1")
+        finally:
+            if not connection.is_closed():
+                await connection.close()
+    async def _sync_deadlines(self):
+        async with AsyncSessionLocal() as session:
+            schedule = await self.newsletter_service.get_upcoming_schedule(
+                session, SCHEDULER_HORIZON_SIZE
+            )
+        self._deadlines = schedule
+        heapq.heapify(self._deadlines)
+    def _sleep_timeout(self) -> float:
+        timeout = self.resync_interval
+        # Без свободных слотов ждать сроков незачем: разбудит завершение отправки
+        if self._deadlines and self.newsletter_service.free_slots > 0:
+            until_deadline = (
+                self._deadlines[0][0] - datetime.datetime.now()
+            ).total_seconds()
+            # Срок в прошлом сразу после обработки: рассылку держит другая
+            # реплика, повторная проверка не чаще раза в SCHEDULER_MIN_SLEEP
+            timeout = min(timeout, max(until_deadline, 0) or SCHEDULER_MIN_SLEEP)
+        return timeout
     async def _run_scheduler(self):
         logger.info("Планировщик рассылок начал работу")
         while self.running:
             try:
+                self._wakeup.clear()
                 await self.newsletter_service.process_pending_newsletters()
-                await asyncio.sleep(self.check_interval)
+                await self._sync_deadlines()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._sleep_timeout())
+                except TimeoutError:
+                    pass
             except asyncio.CancelledError:
                 logger.info("Планировщик был отменен")
                 break
             except Exception as e:
                 logger.error(f"Ошибка в планировщике рассылок: {e}")
-                await asyncio.sleep(self.check_interval)
+                await asyncio.sleep(SCHEDULER_MIN_SLEEP)
         logger.info("Планировщик рассылок завершил работу")
 scheduler = None
 async def start_newsletter_scheduler(bot: Bot):
     global scheduler
     if scheduler is None:
-        scheduler = NewsletterScheduler(
-            bot, check_interval=60
-        )
+        scheduler = NewsletterScheduler(bot)
     await scheduler.start()
+def wake_newsletter_scheduler():
+    if scheduler:
+        scheduler.wake()
 async def stop_newsletter_scheduler():
     global scheduler
     if scheduler:
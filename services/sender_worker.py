@@ -0,0 +1,86 @@
+import asyncio
+import os
+import socket
+from functools import partial
+
+from aiogram import Bot
+
+from models.database import AsyncSessionLocal
+from services.delivery_stream import DeliveryStream
+from services.newsletter_service import NewsletterService
+from utils.logger import get_logger
+from utils.redis import get_redis
+from utils.telegram import create_bot
+
+logger = get_logger(__name__)
+
+
+class SenderWorker:
+    """Отдельный процесс-отправитель: читает пачки доставки из Redis Stream"""
+
+    def __init__(self, bot: Bot, stream: DeliveryStream, consumer: str):
+        self.bot = bot
+        self.stream = stream
+        self.consumer = consumer
+        self.newsletter_service = NewsletterService(bot)
+        self.running = False
+
+    async def run(self):
+        await self.stream.ensure_group()
+        self.running = True
+        logger.info(f"Воркер рассылок {self.consumer} запущен")
+        while self.running:
+            try:
+                entries = await self.stream.reclaim(self.consumer)
+                if not entries:
+                    entries = await self.stream.read(self.consumer)
+                for entry_id, fields in entries:
+                    await self._process(entry_id, fields)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка в воркере рассылок {self.consumer}: {e}")
+                await asyncio.sleep(5)
+        logger.info(f"Воркер рассылок {self.consumer} остановлен")
+
+    async def _process(self, entry_id: str, fields: dict[str, str]):
+        newsletter_id, delivery_ids = self.stream.parse(fields)
+        async with AsyncSessionLocal() as session:
+            stats = await self.newsletter_service.deliver_batch(
+                session,
+                newsletter_id,
+                delivery_ids,
+                on_renew=partial(self.stream.touch, self.consumer, entry_id),
+            )
+            pending = await self.newsletter_service.count_pending_deliveries(
+                session, delivery_ids
+            )
+        if pending:
+            # Часть строк арендована другим воркером: запись остается
+            # неподтвержденной и будет забрана повторно, если он упадет
+            logger.warning(
+                f"Воркер {self.consumer}: в пачке {entry_id} осталось "
+                f"{pending} неотправленных получателей, запись не подтверждена"
+            )
+            return
+        await self.stream.ack(entry_id)
+        logger.info(
+            f"Воркер {self.consumer}: пачка {entry_id} рассылки {newsletter_id} "
+            f"обработана (успешно: {stats.success}, ошибок: {stats.failed})"
+        )
+
+
+async def main():
+    bot = create_bot()
+    redis = get_redis()
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    worker = SenderWorker(bot, DeliveryStream(redis), consumer)
+    try:
+        await worker.run()
+    finally:
+        await bot.session.close()
+        await redis.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from models.models import Role, User
+from services.role_cache import role_cache
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -30,6 +31,7 @@ async def create_user(
     try:
         await session.commit()
         await session.refresh(new_user)
+        await role_cache.invalidate(telegram_id)
         logger.info(f"Успешно создан пользователь с telegram_id: {telegram_id}")
         return new_user
     except IntegrityError as e:
@@ -37,14 +39,26 @@ async def create_user(
         logger.error(f"Ошибка создания пользователя {telegram_id}: {e}")
         raise
 async def update_user(
-    session: AsyncSession, telegram_id: int, email: str, role: Role
+    session: AsyncSession,
+    telegram_id: int,
+    email: str,
+    role: Role,
+    user: User | None = None,
 ) -> User:
-    user = await get_user_by_telegram_id(session, telegram_id)
+    user = user or await get_user_by_telegram_id(session, telegram_id)
     if not user:
         raise ValueError(f"Пользователь с telegram_id {telegram_id} не найден")
     user.email = email
     user.role_id = role.id
     await session.commit()
     await session.refresh(user)
+    await role_cache.invalidate(telegram_id)
     logger.info(f"Обновлены данные пользователя {telegram_id}")
     return user
+async def restore_user_reachability(session: AsyncSession, user: User) -> None:
+    if user.is_reachable:
+        return
+    user.is_reachable = True
+    user.blocked_at = None
+    await session.commit()
+    logger.info(f"Пользователь {user.telegram_id} снова доступен для рассылок")
@@ -0,0 +1,178 @@
+"""Локальная подмена Telegram Bot API для нагрузочного тестирования.
+
+Запуск: python -m tools.fake_bot_api --port 8081 --latency-ms 40 --rate-403 0.05
+Бот направляется на сервер переменной окружения BOT_API_SERVER=http://localhost:8081.
+Счетчики запросов и ошибок доступны по GET /stats, сброс — POST /stats/reset.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+MEDIA_METHODS = {
+    "sendPhoto": "caption",
+    "sendVideo": "caption",
+    "sendAnimation": "caption",
+    "sendDocument": "caption",
+}
+
+
+class FakeBotApi:
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        rate_429: float = 0,
+        retry_after: int = 1,
+        rate_403: float = 0,
+        rate_400: float = 0,
+        flood_limit: float = 0,
+    ):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_403 = rate_403
+        self.rate_400 = rate_400
+        self.flood_limit = flood_limit
+        self.counters: Counter[str] = Counter()
+        self._message_id = 0
+        self._window_started = time.monotonic()
+        self._window_count = 0
+        self._started_at = time.monotonic()
+
+    @staticmethod
+    def _chat_bucket(chat_id: int, salt: int) -> float:
+        # Детерминированно: один и тот же пользователь всегда "заблокировал" бота
+        return ((chat_id * 2654435761 + salt) % 10_000) / 10_000
+
+    def _flood_exceeded(self) -> bool:
+        if not self.flood_limit:
+            return False
+        now = time.monotonic()
+        if now - self._window_started >= 1:
+            self._window_started = now
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count > self.flood_limit
+
+    def _error(self, code: int, description: str, **parameters) -> web.Response:
+        self.counters[f"error_{code}"] += 1
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.json_response(body, status=code)
+
+    def _message(self, chat_id: int, fields: dict) -> dict:
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if fields.get("text"):
+            message["text"] = fields["text"]
+        if fields.get("caption"):
+            message["caption"] = fields["caption"]
+        return message
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        fields = dict(await request.post())
+        self.counters[method] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if method == "getUpdates":
+            await asyncio.sleep(min(float(fields.get("timeout", 0)), 1.0))
+            return web.json_response({"ok": True, "result": []})
+        if method == "getMe":
+            return web.json_response(
+                {
+                    "ok": True,
+                    "result": {
+                        "id": 1,
+                        "is_bot": True,
+                        "first_name": "FakeBot",
+                        "username": "fake_bot",
+                    },
+                }
+            )
+        if method in ("deleteWebhook", "answerCallbackQuery"):
+            return web.json_response({"ok": True, "result": True})
+        if method not in MEDIA_METHODS and method not in (
+            "sendMessage",
+            "editMessageText",
+        ):
+            return self._error(404, "Not Found: method not found")
+        chat_id = int(fields.get("chat_id", 0))
+        if self._flood_exceeded() or random.random() < self.rate_429:
+            return self._error(
+                429,
+                f"Too Many Requests: retry after {self.retry_after}",
+                retry_after=self.retry_after,
+            )
+        if self._chat_bucket(chat_id, 0) < self.rate_403:
+            return self._error(403, "Forbidden: bot was blocked by the user")
+        if self._chat_bucket(chat_id, 7919) < self.rate_400:
+            return self._error(400, "Bad Request: chat not found")
+        self.counters["ok"] += 1
+        return web.json_response({"ok": True, "result": self._message(chat_id, fields)})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        elapsed = time.monotonic() - self._started_at
+        return web.json_response(
+            {
+                "elapsed": elapsed,
+                "ok_per_second": self.counters["ok"] / elapsed if elapsed else 0,
+                "counters": dict(self.counters),
+            }
+        )
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.counters.clear()
+        self._started_at = time.monotonic()
+        return web.json_response({"ok": True})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_post("/stats/reset", self.handle_reset)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        return app
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate-403", type=float, default=0)
+    parser.add_argument("--rate-400", type=float, default=0)
+    parser.add_argument(
+        "--flood-limit",
+        type=float,
+        default=0,
+        help="отвечать 429 сверх этого числа запросов в секунду (0 — выключено)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    api = FakeBotApi(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        rate_403=args.rate_403,
+        rate_400=args.rate_400,
+        flood_limit=args.flood_limit,
+    )
+    web.run_app(api.make_app(), host=args.host, port=args.port)
@@ -0,0 +1,398 @@
+"""Бенчмарк горячего пути рассылки на аудиториях разного размера.
+
+Запуск: python -m tools.newsletter_bench --sizes 10000,100000,1000000
+DATABASE_URL должен указывать на отдельную базу с примененными миграциями:
+бенчмарк создает в ней пользователей и рассылки, а по завершении удаляет их.
+Результаты (msgs/s, пик выделенной памяти, число SQL-запросов) печатаются
+и сохраняются в JSON для сравнения между релизами. Пик памяти считается
+tracemalloc отдельно для каждого шага; tracemalloc замедляет выполнение,
+поэтому для чистых замеров времени есть --no-trace-memory. Сервис рассылки
+работает только с базой --database-url: прогресс никуда не пишется, очередь
+Redis не используется.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.database import DATABASE_URL
+from models.models import (
+    ContentTypeEnum,
+    Newsletter,
+    NewsletterButton,
+    NewsletterStatusEnum,
+    Role,
+    TargetAudienceEnum,
+    User,
+)
+from services.newsletter_service import NewsletterService
+from services.payload import NewsletterPayload
+from services.progress import DeliveryProgress
+from utils.serialization import JSON_BACKEND, json_dumps, json_loads
+
+BENCH_TELEGRAM_ID_BASE = 9_000_000_000_000
+BENCH_EMAIL_DOMAIN = "@bench.invalid"
+SEED_BATCH_SIZE = 10_000
+KEYBOARD_ITERATIONS = 10_000
+JSON_BACKENDS = [("json", json.dumps, json.loads)]
+if JSON_BACKEND != "json":
+    JSON_BACKENDS.append((JSON_BACKEND, json_dumps, json_loads))
+
+
+class FakeSession(BaseSession):
+    """Сессия aiogram без сети: отвечает на любой метод отправки сообщением"""
+
+    def __init__(self, latency: float = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.requests = 0
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod, timeout: int | None = None
+    ):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return Message(
+            message_id=self.requests,
+            date=datetime.datetime.now(),
+            chat=Chat(id=method.chat_id, type="private"),
+            text=getattr(method, "text", None),
+        )
+
+    async def stream_content(
+        self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True
+    ):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class NullProgress(DeliveryProgress):
+    """Прогресс бенчмарка не попадает в общий Redis"""
+
+    def __init__(self):
+        pass
+
+    async def start(self, newsletter_id: int, stats):
+        pass
+
+    async def add(self, newsletter_id: int, sent: int, failed: int):
+        pass
+
+    async def finish(self, newsletter_id: int):
+        pass
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+@dataclass
+class BenchResult:
+    name: str
+    size: int
+    seconds: float
+    cpu_seconds: float
+    ops_per_second: float
+    queries: int
+    peak_alloc_mb: float | None
+    peak_rss_mb: float
+    extra: dict = field(default_factory=dict)
+
+
+def peak_rss_mb() -> float:
+    """Пик RSS всего процесса: растет от шага к шагу, сравнивать по нему
+    шаги нельзя, для этого есть peak_alloc_mb"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS — байты
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+class Measure:
+    def __init__(self, name: str, size: int, counter: QueryCounter, results: list):
+        self.name = name
+        self.size = size
+        self.counter = counter
+        self.results = results
+        self.extra: dict = {}
+
+    def __enter__(self):
+        self.alloc_started = None
+        if tracemalloc.is_tracing():
+            self.alloc_started = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.queries = self.counter.count
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            return False
+        seconds = time.perf_counter() - self.started
+        cpu_seconds = time.process_time() - self.cpu_started
+        peak_alloc_mb = None
+        if self.alloc_started is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            peak_alloc_mb = (peak - self.alloc_started) / 1024 / 1024
+        result = BenchResult(
+            name=self.name,
+            size=self.size,
+            seconds=seconds,
+            cpu_seconds=cpu_seconds,
+            ops_per_second=self.size / seconds if seconds else 0,
+            queries=self.counter.count - self.queries,
+            peak_alloc_mb=peak_alloc_mb,
+            peak_rss_mb=peak_rss_mb(),
+            extra=self.extra,
+        )
+        self.results.append(result)
+        print(
+            f"{result.name:<28} n={result.size:<9} {result.seconds:8.2f}s "
+            f"{result.ops_per_second:12.0f}/s "
+            f"cpu={result.cpu_seconds / result.size * 1e6:.1f}us/op queries={result.queries:<6} "
+            f"alloc={result.peak_alloc_mb or 0:.1f}MB rss={result.peak_rss_mb:.0f}MB"
+        )
+        return False
+
+
+def make_keyboard_newsletter(**fields) -> Newsletter:
+    return Newsletter(
+        text="<b>Бенчмарк</b>",
+        target_audience=TargetAudienceEnum.ALL,
+        content_type=ContentTypeEnum.TEXT,
+        inline_buttons=[
+            NewsletterButton(
+                text=f"Кнопка {row}-{column}",
+                url=f"https://example.com/{row}/{column}",
+                row_position=row,
+                column_position=column,
+            )
+            for row in range(3)
+            for column in range(2)
+        ],
+        media_files=[],
+        **fields,
+    )
+
+
+async def seed_users(session: AsyncSession, size: int) -> int:
+    role = await session.scalar(select(Role).where(Role.name == "user"))
+    if role is None:
+        role = Role(name="user")
+        session.add(role)
+        await session.flush()
+    for start in range(0, size, SEED_BATCH_SIZE):
+        await session.execute(
+            insert(User),
+            [
+                {
+                    "email": f"bench-{i}{BENCH_EMAIL_DOMAIN}",
+                    "telegram_id": BENCH_TELEGRAM_ID_BASE + i,
+                    "role_id": role.id,
+                }
+                for i in range(start, min(start + SEED_BATCH_SIZE, size))
+            ],
+        )
+    creator_id = await session.scalar(
+        select(User.id).where(User.telegram_id == BENCH_TELEGRAM_ID_BASE)
+    )
+    await session.commit()
+    return creator_id
+
+
+async def cleanup(session: AsyncSession):
+    bench_users = select(User.id).where(User.email.like(f"%{BENCH_EMAIL_DOMAIN}"))
+    bench_newsletters = select(Newsletter.id).where(
+        Newsletter.creator_id.in_(bench_users)
+    )
+    await session.execute(
+        delete(NewsletterButton).where(
+            NewsletterButton.newsletter_id.in_(bench_newsletters)
+        )
+    )
+    await session.execute(
+        delete(Newsletter).where(Newsletter.id.in_(bench_newsletters))
+    )
+    await session.execute(delete(User).where(User.id.in_(bench_users)))
+    await session.commit()
+
+
+async def create_newsletter(session: AsyncSession, creator_id: int) -> int:
+    newsletter = make_keyboard_newsletter(
+        creator_id=creator_id, status=NewsletterStatusEnum.PENDING
+    )
+    session.add(newsletter)
+    await session.commit()
+    return newsletter.id
+
+
+def bench_serialization(
+    size: int, payload: NewsletterPayload, counter: QueryCounter, results: list
+):
+    """CPU на сериализацию запроса и разбор ответа Bot API для каждого бэкенда"""
+    response = json.dumps(
+        {
+            "ok": True,
+            "result": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": BENCH_TELEGRAM_ID_BASE, "type": "private"},
+                "text": payload.method.text,
+                "reply_markup": payload.method.reply_markup.model_dump(
+                    exclude_none=True
+                ),
+            },
+        }
+    )
+    cpu_per_message = {}
+    for backend, dumps, loads in JSON_BACKENDS:
+        session = FakeSession(json_dumps=dumps, json_loads=loads)
+        bot = Bot(token="42:BENCHMARK", session=session)
+        with Measure(f"serialize_{backend}", size, counter, results) as m:
+            for i in range(size):
+                method = payload.for_chat(BENCH_TELEGRAM_ID_BASE + i)
+                files = {}
+                for value in method.model_dump(warnings=False).values():
+                    session.prepare_value(value, bot=bot, files=files)
+                session.check_response(bot, method, 200, response)
+        cpu_per_message[backend] = results[-1].cpu_seconds / size * 1e6
+        if backend != "json":
+            m.extra["cpu_us_saved_per_message"] = (
+                cpu_per_message["json"] - cpu_per_message[backend]
+            )
+
+
+async def bench_size(
+    size: int,
+    session_factory: sessionmaker,
+    counter: QueryCounter,
+    latency: float,
+    results: list,
+):
+    fake_session = FakeSession(latency=latency)
+    bot = Bot(token="42:BENCHMARK", session=fake_session)
+    service = NewsletterService(bot)
+    service.session_factory = session_factory
+    service.progress = NullProgress()
+    service.delivery_backend = "local"
+    async with session_factory() as session:
+        await cleanup(session)
+        creator_id = await seed_users(session, size)
+    try:
+        async with session_factory() as session:
+            with Measure("get_target_users", size, counter, results):
+                users = await service._get_target_users(session, TargetAudienceEnum.ALL)
+            del users
+        async with session_factory() as session:
+            newsletter_id = await create_newsletter(session, creator_id)
+            newsletter = await service._load_newsletter(session, newsletter_id)
+            with Measure("materialize_and_page", size, counter, results) as m:
+                await service._materialize_deliveries(session, newsletter)
+                await session.commit()
+                pages = 0
+                async for _ in service._iter_pending_deliveries(
+                    session, newsletter_id, []
+                ):
+                    pages += 1
+                m.extra["pages"] = pages
+        keyboard_newsletter = make_keyboard_newsletter(id=0)
+        with Measure("create_inline_keyboard", KEYBOARD_ITERATIONS, counter, results):
+            for _ in range(KEYBOARD_ITERATIONS):
+                service._create_inline_keyboard(keyboard_newsletter)
+        payload = service._compile_payload(keyboard_newsletter)
+        bench_serialization(size, payload, counter, results)
+        with Measure("send_message_to_user", size, counter, results):
+            for i in range(size):
+                await service._send_message_to_user(BENCH_TELEGRAM_ID_BASE + i, payload)
+        async with session_factory() as session:
+            newsletter_id = await create_newsletter(session, creator_id)
+            requests_before = fake_session.requests
+            with Measure("send_newsletter", size, counter, results) as m:
+                stats = await service.send_newsletter(session, newsletter_id)
+                m.extra["success"] = stats["success"]
+                m.extra["failed"] = stats["failed"]
+                m.extra["api_requests"] = fake_session.requests - requests_before
+    finally:
+        async with session_factory() as session:
+            await cleanup(session)
+        await bot.session.close()
+
+
+async def main(args: argparse.Namespace):
+    if args.trace_memory:
+        tracemalloc.start()
+    engine = create_async_engine(args.database_url, echo=False)
+    session_factory = sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    counter = QueryCounter(engine)
+    results: list[BenchResult] = []
+    try:
+        for size in args.sizes:
+            await bench_size(
+                size, session_factory, counter, args.latency_ms / 1000, results
+            )
+    finally:
+        await engine.dispose()
+    report = {
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency_ms": args.latency_ms,
+        "trace_memory": args.trace_memory,
+        "results": [asdict(result) for result in results],
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Newsletter hot path benchmark")
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[10_000, 100_000, 1_000_000],
+    )
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0,
+        help="искусственная задержка ответа фейкового Bot API",
+    )
+    parser.add_argument(
+        "--no-trace-memory",
+        dest="trace_memory",
+        action="store_false",
+        help="не считать пик памяти по шагам (без накладных расходов tracemalloc)",
+    )
+    parser.add_argument("--output", default="newsletter_bench.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
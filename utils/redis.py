@@ -0,0 +1,12 @@
+from decouple import config
+from redis.asyncio import Redis
+
+REDIS_URL = config("REDIS_URL", default="redis://redis:6379/0")
+_redis: Redis | None = None
+
+
+def get_redis() -> Redis:
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
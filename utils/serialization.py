@@ -0,0 +1,21 @@
+"""JSON для Bot API и FSM-хранилища: orjson, если установлен, иначе stdlib."""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    json_loads = orjson.loads
+else:
+    JSON_BACKEND = "json"
+    json_dumps = json.dumps
+    json_loads = json.loads
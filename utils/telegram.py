@@ -0,0 +1,142 @@
+import time
+from dataclasses import asdict, dataclass
+
+from aiogram import Bot, __version__
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.methods import TelegramMethod
+from aiohttp import ClientSession, ClientTimeout, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from decouple import config
+
+from services.outbound import PriorityRequestMiddleware
+from utils.serialization import json_dumps, json_loads
+
+BOT_API_SERVER = config("BOT_API_SERVER", default="")
+BOT_HTTP_POOL_LIMIT = config("BOT_HTTP_POOL_LIMIT", default=100, cast=int)
+BOT_HTTP_POOL_LIMIT_PER_HOST = config(
+    "BOT_HTTP_POOL_LIMIT_PER_HOST", default=0, cast=int
+)
+BOT_HTTP_KEEPALIVE_TIMEOUT = config(
+    "BOT_HTTP_KEEPALIVE_TIMEOUT", default=60, cast=float
+)
+BOT_HTTP_DNS_CACHE_TTL = config("BOT_HTTP_DNS_CACHE_TTL", default=3600, cast=int)
+BOT_HTTP_CONNECT_TIMEOUT = config("BOT_HTTP_CONNECT_TIMEOUT", default=10, cast=float)
+BOT_HTTP_TIMEOUT = config("BOT_HTTP_TIMEOUT", default=60, cast=float)
+
+
+@dataclass
+class PoolStats:
+    limit: int
+    in_flight: int = 0
+    waiting: int = 0
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    queued: int = 0
+    queued_seconds: float = 0.0
+
+    @property
+    def utilisation(self) -> float:
+        return self.in_flight / self.limit if self.limit else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "utilisation": self.utilisation}
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """Сессия Bot API с настраиваемым пулом соединений и счетчиками его загрузки"""
+
+    def __init__(
+        self,
+        limit: int = BOT_HTTP_POOL_LIMIT,
+        limit_per_host: int = BOT_HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = BOT_HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache: int = BOT_HTTP_DNS_CACHE_TTL,
+        connect_timeout: float = BOT_HTTP_CONNECT_TIMEOUT,
+        timeout: float = BOT_HTTP_TIMEOUT,
+        **kwargs,
+    ):
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        self._connector_init.update(
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=ttl_dns_cache,
+        )
+        self.connect_timeout = connect_timeout
+        self.pool_stats = PoolStats(limit=limit)
+
+    def _trace_config(self) -> TraceConfig:
+        stats = self.pool_stats
+        trace = TraceConfig()
+
+        async def on_request_start(session, context, params):
+            stats.requests += 1
+            stats.in_flight += 1
+
+        async def on_request_done(session, context, params):
+            stats.in_flight -= 1
+
+        async def on_queued_start(session, context, params):
+            context.queued_at = time.monotonic()
+            stats.queued += 1
+            stats.waiting += 1
+
+        async def on_queued_end(session, context, params):
+            stats.waiting -= 1
+            stats.queued_seconds += time.monotonic() - context.queued_at
+
+        async def on_connection_created(session, context, params):
+            stats.connections_created += 1
+
+        async def on_connection_reused(session, context, params):
+            stats.connections_reused += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_done)
+        trace.on_request_exception.append(on_request_done)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_connection_create_end.append(on_connection_created)
+        trace.on_connection_reuseconn.append(on_connection_reused)
+        return trace
+
+    async def create_session(self) -> ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"},
+                trace_configs=[self._trace_config()],
+            )
+            self._should_reset_connector = False
+        return self._session
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod, timeout: int | None = None
+    ):
+        # aiogram передает в aiohttp только общий таймаут, добавляем таймаут
+        # соединения, чтобы недоступный API не занимал слот пула надолго
+        total = self.timeout if timeout is None else timeout
+        return await super().make_request(
+            bot,
+            method,
+            timeout=ClientTimeout(total=total, connect=self.connect_timeout),
+        )
+
+
+def create_bot() -> Bot:
+    api = TelegramAPIServer.from_base(BOT_API_SERVER) if BOT_API_SERVER else PRODUCTION
+    session = PooledAiohttpSession(
+        api=api, json_loads=json_loads, json_dumps=json_dumps
+    )
+    session.middleware(PriorityRequestMiddleware())
+    return Bot(
+        token=config("BOT_TOKEN"),
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )